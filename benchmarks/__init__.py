@@ -0,0 +1,15 @@
+"""Benchmarks of the simplifier on seeded random and structured formulas.
+
+    $ python -m benchmarks --output report.json
+    $ python -m benchmarks --baseline report.json
+
+See benchmarks.generators for the inputs and benchmarks.run for the
+measures and the report."""
+import os
+import sys
+
+# the modules of simbool import each other by their bare names, which
+# Python 3 only finds with the directory of the package on the path, so
+# the benchmarks import them the same way
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'simbool'))
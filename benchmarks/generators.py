@@ -0,0 +1,60 @@
+"""Seeded generators of benchmark formulas over the atoms x1, x2, ...
+
+The same arguments (seed included) always give the same formula."""
+import random
+
+from proposition import Prop
+
+# clause/variable ratio of the satisfiability threshold of random 3-SAT
+THRESHOLD_3SAT = 4.26
+
+def _atoms(n):
+    return [Prop('x%d' % (i+1)) for i in range(n)]
+
+def _literal(rng, atom):
+    return atom if rng.random() < 0.5 else Prop('~', atom)
+
+def random_ksat(n, k=3, ratio=THRESHOLD_3SAT, seed=0):
+    """Conjunction of round(ratio*n) clauses of k literals over k distinct
+    variables among n."""
+    rng = random.Random(seed)
+    atoms = _atoms(n)
+    clauses = [Prop('|', *[_literal(rng, x) for x in rng.sample(atoms, k)])
+               for _ in range(int(round(ratio*n)))]
+    return Prop('&', *clauses)
+
+def random_dnf(n, terms, width=3, seed=0):
+    """Disjunction of terms conjunctions of width literals over distinct
+    variables among n."""
+    rng = random.Random(seed)
+    atoms = _atoms(n)
+    return Prop('|', *[Prop('&', *[_literal(rng, x) for x in rng.sample(atoms, width)])
+                       for _ in range(terms)])
+
+def parity(n, seed=0):
+    """Chain of exclusive ors of n literals, each one written with & and
+    |: ((x1 ^ x2) ^ x3) ^ ..."""
+    rng = random.Random(seed)
+    atoms = [_literal(rng, x) for x in _atoms(n)]
+    rng.shuffle(atoms)
+    P = atoms[0]
+    for x in atoms[1:]:
+        P = (P & ~x) | (~P & x)
+    return P
+
+def deep_formula(depth, n, seed=0):
+    """Left-deep chain of depth random operations (&, |, or a negation
+    of what is built so far) with literals over n variables, as built by
+    the Python operators on long expressions."""
+    rng = random.Random(seed)
+    atoms = _atoms(n)
+    P = _literal(rng, rng.choice(atoms))
+    for _ in range(depth):
+        r = rng.random()
+        if r < 0.1:
+            P = ~P
+        elif r < 0.55:
+            P = P & _literal(rng, rng.choice(atoms))
+        else:
+            P = P | _literal(rng, rng.choice(atoms))
+    return P
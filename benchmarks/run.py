@@ -0,0 +1,154 @@
+"""Timing of the simplification passes on the benchmark suite.
+
+Every (case, pass) measure runs in a fresh process, so that the caches
+of the passes start empty and the peak memory (the maximum resident set
+size, in kilobytes on Linux) is that of the measure alone. The report is
+a JSON document:
+
+    {"version": 1, "python": "2.7.18",
+     "results": {"<case>": {"<pass>": {"time": seconds, "size_in": ...,
+                                       "size_out": ..., "ratio": out/in,
+                                       "peak_kb": ...}}}}
+
+compare() checks a report against a baseline one: a measure regresses
+when it takes more than (1 + tolerance) times the baseline time, or when
+its result is larger."""
+from __future__ import print_function
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+
+from benchmarks import generators
+from memo import clear_caches
+from simplify import simplify_basic, simplify_pure, ultra_simplify, simplify
+
+REPORT_VERSION = 1
+
+# name -> (generator, arguments)
+SUITE = [
+    ('3sat-12', (generators.random_ksat, {'n': 12, 'seed': 1})),
+    ('3sat-20', (generators.random_ksat, {'n': 20, 'seed': 1})),
+    ('dnf-10x20', (generators.random_dnf, {'n': 10, 'terms': 20, 'seed': 1})),
+    ('parity-5', (generators.parity, {'n': 5, 'seed': 1})),
+    ('deep-3000', (generators.deep_formula, {'depth': 3000, 'n': 1000, 'seed': 1})),
+]
+
+# the cases small enough for quick runs
+QUICK = ['3sat-12', 'dnf-10x20', 'parity-5', 'deep-3000']
+
+def _ultra(depth):
+    def run(P):
+        res = ultra_simplify(P, depth)
+        return P if res is None else res
+    return run
+
+# name -> (preparation, not timed, and timed pass)
+PASSES = [
+    ('simplify_basic', (None, simplify_basic)),
+    ('simplify_pure', (None, simplify_pure)),
+    ('ultra_simplify-1', (simplify_pure, _ultra(1))),
+    ('ultra_simplify-2', (simplify_pure, _ultra(2))),
+    ('ultra_simplify-3', (simplify_pure, _ultra(3))),
+    ('simplify', (None, simplify)),
+]
+
+# the passes of quick runs, about ten seconds in all: at depth 3,
+# ultra_simplify alone takes several seconds on dnf-10x20
+QUICK_PASSES = [p for p, _ in PASSES if p != 'ultra_simplify-3']
+
+def formula(case):
+    generator, kwargs = dict(SUITE)[case]
+    return generator(**kwargs)
+
+def measure(task):
+    """Runs the pass on the formula of the case, in the current process.
+    Returns the dict of the measures."""
+    case, name = task
+    prepare, run = dict(PASSES)[name]
+    clear_caches()
+    P = formula(case)
+    if prepare is not None:
+        P = prepare(P)
+    start = time.time()
+    res = run(P)
+    elapsed = time.time() - start
+    return {'time': elapsed, 'size_in': P.size(), 'size_out': res.size(),
+            'ratio': float(res.size())/P.size(),
+            'peak_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}
+
+def run(cases=None, passes=None, log=None):
+    """Measures every pass of passes (by default, all of them) on every
+    case of cases (by default, the whole suite), each in its own process.
+    Returns the report."""
+    cases = cases or [c for c, _ in SUITE]
+    passes = passes or [p for p, _ in PASSES]
+    results = {}
+    for case in cases:
+        results[case] = {}
+        for name in passes:
+            pool = multiprocessing.Pool(1)
+            try:
+                res = pool.apply(measure, [(case, name)])
+            finally:
+                pool.terminate()
+            results[case][name] = res
+            if log is not None:
+                log('%-12s %-18s %9.3fs %7d -> %-7d %9d kB' %
+                    (case, name, res['time'], res['size_in'], res['size_out'], res['peak_kb']))
+    return {'version': REPORT_VERSION, 'python': platform.python_version(),
+            'results': results}
+
+def compare(report, baseline, tolerance=0.25):
+    """Returns the list of the regressions of report with respect to
+    baseline, as strings. The measures missing from either are skipped."""
+    if baseline.get('version') != REPORT_VERSION:
+        raise NameError("Unsupported baseline report version: "+str(baseline.get('version')))
+    regressions = []
+    for case, passes in sorted(report['results'].items()):
+        for name, res in sorted(passes.items()):
+            base = baseline['results'].get(case, {}).get(name)
+            if base is None:
+                continue
+            if res['time'] > (1 + tolerance)*base['time']:
+                regressions.append('%s %s: %.3fs instead of %.3fs' %
+                                   (case, name, res['time'], base['time']))
+            if res['size_out'] > base['size_out']:
+                regressions.append('%s %s: result of size %d instead of %d' %
+                                   (case, name, res['size_out'], base['size_out']))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description=__doc__.split('\n')[0])
+    parser.add_argument('--quick', action='store_true',
+                        help='only the small cases, without ultra_simplify-3')
+    parser.add_argument('--case', action='append', dest='cases',
+                        choices=[c for c, _ in SUITE], help='case to run (repeatable)')
+    parser.add_argument('--pass', action='append', dest='passes',
+                        choices=[p for p, _ in PASSES], help='pass to run (repeatable)')
+    parser.add_argument('--output', help='file to write the JSON report to')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown (default: 0.25)')
+    args = parser.parse_args(argv)
+
+    cases = args.cases or (QUICK if args.quick else None)
+    passes = args.passes or (QUICK_PASSES if args.quick else None)
+    report = run(cases, passes, log=print)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for r in regressions:
+            print('REGRESSION', r)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
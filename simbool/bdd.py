@@ -0,0 +1,371 @@
+"""Reduced ordered binary decision diagrams.
+
+A BDD manager stores every node once in a unique table, as the triple
+(level, low, high) of the position of its variable in the order and of
+its two children, so that equivalent propositions compiled in the same
+manager get the same node. Nodes are plain integers; 0 and 1 are the
+False and True terminals. ite() and everything built on it go through a
+bounded computed table (a memo.LRUCache)."""
+from proposition import Prop
+from memo import LRUCache, postorder
+from simplify import simplify_pure
+
+FALSE = 0
+TRUE = 1
+
+# sifting stops moving a variable in a direction once the size of the
+# BDD exceeds this many times the best size found
+MAX_GROWTH = 2.0
+
+class BDD(object):
+    def __init__(self, order=(), cache_size=1 << 16):
+        self.order = []
+        self.level = {}
+        # node -> level, low and high children; the terminals sit below
+        # every variable
+        self._level = [None, None]
+        self._low = [None, None]
+        self._high = [None, None]
+        # number of nodes referring to every node (see sift)
+        self._refs = [0, 0]
+        self._unique = {}
+        # nodes of every level
+        self._nodes = []
+        self._computed = LRUCache(cache_size)
+        for var in order:
+            self.add_var(var)
+
+    def add_var(self, var):
+        """Appends the atomic proposition var at the bottom of the order."""
+        if var not in self.level:
+            self.level[var] = len(self.order)
+            self.order.append(var)
+            self._nodes.append(set())
+        return self.level[var]
+
+    def var(self, var):
+        """The node of the atomic proposition var."""
+        return self.mk(self.add_var(var), FALSE, TRUE)
+
+    def node_level(self, u):
+        if u <= TRUE:
+            return len(self.order)
+        return self._level[u]
+
+    def mk(self, level, low, high):
+        if low == high:
+            return low
+        key = (level, low, high)
+        u = self._unique.get(key)
+        if u is None:
+            u = len(self._level)
+            self._level.append(level)
+            self._low.append(low)
+            self._high.append(high)
+            self._refs.append(0)
+            for v in (low, high):
+                if v > TRUE:
+                    self._refs[v] += 1
+            self._unique[key] = u
+            self._nodes[level].add(u)
+        return u
+
+    def ite(self, f, g, h):
+        """If-then-else: the node of (f & g) | (~f & h)."""
+        if f == TRUE:
+            return g
+        if f == FALSE:
+            return h
+        if g == h:
+            return g
+        if g == TRUE and h == FALSE:
+            return f
+
+        key = (f, g, h)
+        res = self._computed.get(key)
+        if res is not None:
+            return res
+
+        top = min(self.node_level(f), self.node_level(g), self.node_level(h))
+        f0, f1 = self._cofactors(f, top)
+        g0, g1 = self._cofactors(g, top)
+        h0, h1 = self._cofactors(h, top)
+        res = self.mk(top, self.ite(f0, g0, h0), self.ite(f1, g1, h1))
+        self._computed.put(key, res)
+        return res
+
+    def _cofactors(self, u, level):
+        if self.node_level(u) != level:
+            return u, u
+        return self._low[u], self._high[u]
+
+    def neg(self, u):
+        return self.ite(u, FALSE, TRUE)
+
+    def conj(self, u, v):
+        return self.ite(u, v, FALSE)
+
+    def disj(self, u, v):
+        return self.ite(u, TRUE, v)
+
+    def from_prop(self, P):
+        """Compiles P, each distinct subterm being compiled once. New
+        variables are appended to the order."""
+        def combine_and(subs):
+            u = subs[0]
+            for v in subs[1:]:
+                u = self.conj(u, v)
+            return u
+
+        def combine_or(subs):
+            u = subs[0]
+            for v in subs[1:]:
+                u = self.disj(u, v)
+            return u
+
+        def compile_(task):
+            P = task[0]
+            if P.is_atomic():
+                if P.name == True:
+                    return None, TRUE
+                if P.name == False:
+                    return None, FALSE
+                return None, self.var(P)
+            if P.get_op() == '~':
+                return [(P.get_terms()[0],)], lambda subs: self.neg(subs[0])
+            return [(x,) for x in P.get_terms()], \
+                   combine_and if P.get_op() == '&' else combine_or
+
+        return postorder((P,), compile_)
+
+    def to_prop(self, u):
+        """A Prop equivalent to the node u: its Shannon expansion, sharing
+        the Prop of every node."""
+        done = {FALSE: Prop(False), TRUE: Prop(True)}
+
+        def convert(u):
+            if u in done:
+                return done[u]
+            x = self.order[self._level[u]]
+            low, high = self._low[u], self._high[u]
+            if low == FALSE and high == TRUE:
+                res = x
+            elif low == TRUE and high == FALSE:
+                res = ~x
+            elif high == TRUE:
+                res = x | convert(low)
+            elif low == TRUE:
+                res = ~x | convert(high)
+            elif high == FALSE:
+                res = ~x & convert(low)
+            elif low == FALSE:
+                res = x & convert(high)
+            else:
+                res = (x & convert(high)) | (~x & convert(low))
+            done[u] = res
+            return res
+
+        return convert(u)
+
+    def restrict(self, u, assignment):
+        """The node of u where the variables of assignment, a dict from
+        atomic propositions to booleans, are replaced by their values."""
+        values = dict((self.level[v], b) for v, b in assignment.items()
+                      if v in self.level)
+        if not values:
+            return u
+        deepest = max(values)
+        done = {}
+
+        def restrict_(u):
+            level = self.node_level(u)
+            if level > deepest:
+                return u
+            if u in done:
+                return done[u]
+            if level in values:
+                res = restrict_(self._high[u] if values[level] else self._low[u])
+            else:
+                res = self.mk(level, restrict_(self._low[u]), restrict_(self._high[u]))
+            done[u] = res
+            return res
+
+        return restrict_(u)
+
+    def size(self, roots):
+        """Number of internal nodes reachable from the nodes of roots."""
+        seen = set()
+        stack = [u for u in roots if u > TRUE]
+        while stack:
+            u = stack.pop()
+            if u in seen:
+                continue
+            seen.add(u)
+            for v in (self._low[u], self._high[u]):
+                if v > TRUE:
+                    stack.append(v)
+        return len(seen)
+
+    def reordered(self, order, roots):
+        """Returns (bdd, new_roots): a new manager with the variable order
+        order, and the nodes of roots transferred into it."""
+        other = BDD(order, self._computed.maxsize)
+        done = {FALSE: FALSE, TRUE: TRUE}
+
+        def transfer(u):
+            if u in done:
+                return done[u]
+            res = other.ite(other.var(self.order[self._level[u]]),
+                            transfer(self._high[u]), transfer(self._low[u]))
+            done[u] = res
+            return res
+
+        return other, [transfer(u) for u in roots]
+
+    def _collect(self, roots):
+        """Drops the nodes not reachable from roots from the tables, and
+        counts the references to the others, roots included."""
+        live = set()
+        stack = [u for u in roots if u > TRUE]
+        while stack:
+            u = stack.pop()
+            if u in live:
+                continue
+            live.add(u)
+            for v in (self._low[u], self._high[u]):
+                if v > TRUE:
+                    stack.append(v)
+        for level, nodes in enumerate(self._nodes):
+            for u in [u for u in nodes if u not in live]:
+                nodes.discard(u)
+                del self._unique[(level, self._low[u], self._high[u])]
+        refs = self._refs
+        for u in live:
+            refs[u] = 0
+        for u in live:
+            for v in (self._low[u], self._high[u]):
+                if v > TRUE:
+                    refs[v] += 1
+        for u in roots:
+            if u > TRUE:
+                refs[u] += 1
+        # the computed table may hold dropped nodes
+        self._computed.clear()
+        return len(live)
+
+    def _deref(self, u):
+        """Drops a reference to u, and u if that was the last one. Returns
+        the number of nodes dropped."""
+        refs, dropped = self._refs, 0
+        stack = [u]
+        while stack:
+            u = stack.pop()
+            if u <= TRUE:
+                continue
+            refs[u] -= 1
+            if refs[u] == 0:
+                level = self._level[u]
+                self._nodes[level].discard(u)
+                del self._unique[(level, self._low[u], self._high[u])]
+                dropped += 1
+                stack += [self._low[u], self._high[u]]
+        return dropped
+
+    def swap(self, i):
+        """Exchanges the variables at levels i and i+1 in place: every node
+        keeps its number and its function, so that the nodes held by the
+        caller stay valid. Only the nodes of these two levels change, and
+        the nodes of y no longer referred to are dropped (the references
+        are the ones counted by sift). Returns the change in the number of
+        nodes."""
+        unique, level, low, high = self._unique, self._level, self._low, self._high
+        refs = self._refs
+        xs, ys = self._nodes[i], self._nodes[i+1]
+        count = len(unique)
+        for u in xs:
+            del unique[(i, low[u], high[u])]
+        for u in ys:
+            del unique[(i+1, low[u], high[u])]
+            level[u] = i
+            unique[(i, low[u], high[u])] = u
+        x, y = self.order[i], self.order[i+1]
+        self.order[i], self.order[i+1] = y, x
+        self.level[x], self.level[y] = i + 1, i
+        self._nodes[i], self._nodes[i+1] = set(ys), set()
+
+        # the nodes of x not depending on y just move down
+        rewrite = []
+        for u in xs:
+            if low[u] in ys or high[u] in ys:
+                rewrite.append(u)
+            else:
+                level[u] = i + 1
+                unique[(i + 1, low[u], high[u])] = u
+                self._nodes[i+1].add(u)
+        # the others become nodes of y over nodes of x
+        for u in rewrite:
+            f0, f1 = low[u], high[u]
+            f00, f01 = (low[f0], high[f0]) if f0 in ys else (f0, f0)
+            f10, f11 = (low[f1], high[f1]) if f1 in ys else (f1, f1)
+            g0 = self.mk(i + 1, f00, f10)
+            g1 = self.mk(i + 1, f01, f11)
+            for g in (g0, g1):
+                if g > TRUE:
+                    refs[g] += 1
+            low[u], high[u] = g0, g1
+            unique[(i, g0, g1)] = u
+            self._nodes[i].add(u)
+            self._deref(f0)
+            self._deref(f1)
+        return len(unique) - count
+
+    def sift(self, roots, max_growth=MAX_GROWTH):
+        """Variable reordering by sifting, in place: every variable in
+        turn, the ones with the most nodes first, is moved by swaps of
+        adjacent levels down to the bottom and up to the top of the
+        order, then back to the position where roots had the fewest
+        nodes. A direction is given up once the size grows beyond
+        max_growth times the best one. The nodes not reachable from roots
+        are dropped from the manager first. Returns (self, roots), roots
+        being unchanged since swaps keep the nodes."""
+        roots = list(roots)
+        size = best = self._collect(roots)
+        n = len(self.order)
+        for var in sorted(self.order, key=lambda v: -len(self._nodes[self.level[v]])):
+            position = best_position = self.level[var]
+            # down, then up
+            for step, stop in [(1, n - 1), (-1, 0)]:
+                while position != stop:
+                    size += self.swap(min(position, position + step))
+                    position += step
+                    if size < best:
+                        best, best_position = size, position
+                    elif size > max_growth*best:
+                        break
+            while position < best_position:
+                size += self.swap(position)
+                position += 1
+            while position > best_position:
+                size += self.swap(position - 1)
+                position -= 1
+        return self, roots
+
+def is_equivalent(P, Q):
+    bdd = BDD()
+    return bdd.from_prop(P) == bdd.from_prop(Q)
+
+def is_tautology(P):
+    return BDD().from_prop(P) == TRUE
+
+def simplify_bdd(P, sift=True):
+    """Alternative to simplify: canonicalizes P as a BDD (reordering its
+    variables by sifting) and simplifies the expansion of the BDD back
+    into a Prop. Returns P itself if that is not smaller."""
+    bdd = BDD()
+    roots = [bdd.from_prop(P)]
+    if sift:
+        bdd, roots = bdd.sift(roots)
+    res = simplify_pure(bdd.to_prop(roots[0]))
+    if res.size() > P.size():
+        return P
+    return res
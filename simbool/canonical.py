@@ -0,0 +1,149 @@
+"""Normal form of propositions up to the renaming of their variables.
+
+    >> C, renaming = canonical_form((A | ~B) & C)
+    >> C
+    (x0 | ~x1) & x2
+    >> renaming
+    {'x0': 'A', 'x1': 'B', 'x2': 'C'}
+    >> rename(C, renaming) == (A | ~B) & C
+    True
+
+Propositions that only differ by the names of their variables get the
+same normal form, so a result computed for one of them can be reused for
+the others: rename it to the canonical names with the inverse of the
+renaming, and back with the renaming of the other one (see
+persistent.PersistentCache).
+
+The variables are ordered by color refinement over the distinct
+subterms: a variable is first told apart from the others by the shapes
+of its occurrences, then by the colors of the variables it occurs with,
+until the colors are stable. Each round is a few passes over the
+subterms. Variables still tied then (which mostly happens when they are
+interchangeable, as A and B in A | B) are told apart one at a time, in
+an order that depends on their names: for the rare formulas whose tied
+variables are not interchangeable, different namings may then give
+different normal forms. The forms are always correct, but such formulas
+can miss a reuse. The colors are computed with MD5 digests of sorted
+tuples rather than hash(), so the normal form of a proposition is the
+same across processes and versions of Python."""
+import hashlib
+
+from proposition import Prop
+from memo import postorder
+
+_OPCODES = {'~': 1, '&': 2, '|': 3}
+
+# colors of the constants, which are never renamed
+_CONSTANTS = {False: -3, True: -4}
+
+def _digest(*parts):
+    h = hashlib.md5()
+    for part in parts:
+        h.update(part)
+    return h.digest()
+
+def _nodes(P):
+    """The distinct subterms of P, each after its terms, as (op, terms
+    indices), or (None, name) for the atoms. P is the last one."""
+    nodes = []
+    def step(task):
+        P = task[0]
+        if P.atomic:
+            nodes.append((None, P.name))
+            return None, len(nodes) - 1
+        op = P.get_op()
+        def combine(kids):
+            nodes.append((op, kids))
+            return len(nodes) - 1
+        return [(x,) for x in P.get_terms()], combine
+    postorder((P,), step)
+    return nodes
+
+def _refine(nodes, variables, colors):
+    """Refines colors (the color of every node of variables) until the
+    number of colors is stable, and returns it."""
+    n = len(nodes)
+    count = len(set(colors[i] for i in variables))
+    root = _digest(b'root')
+    while True:
+        # shape of every subterm, given the colors of its variables
+        up = [None]*n
+        for i, (op, arg) in enumerate(nodes):
+            if op is None:
+                up[i] = _digest(b'atom', str(colors[i]).encode('ascii'))
+            else:
+                up[i] = _digest(str(_OPCODES[op]).encode('ascii'),
+                                *sorted([up[k] for k in arg]))
+        # contexts of the occurrences of every subterm, from the root down
+        down = [root]*n
+        contexts = [[] for _ in range(n)]
+        for i in range(n - 1, -1, -1):
+            if i < n - 1:
+                down[i] = _digest(*sorted(contexts[i]))
+            contexts[i] = None
+            op, arg = nodes[i]
+            if op is not None:
+                context = _digest(down[i], up[i])
+                for k in arg:
+                    contexts[k].append(context)
+
+        signatures = sorted(set((colors[i], down[i]) for i in variables))
+        rank = dict((s, r) for r, s in enumerate(signatures))
+        for i in variables:
+            colors[i] = rank[(colors[i], down[i])]
+        if len(signatures) == count:
+            return count
+        count = len(signatures)
+
+def canonical_form(P):
+    """Returns (C, renaming): the normal form C of P, whose variables are
+    named x0, x1..., and the dict mapping these names to the variables of
+    P, so that rename(C, renaming) == P."""
+    nodes = _nodes(P)
+    variables = [i for i, (op, name) in enumerate(nodes)
+                 if op is None and name not in _CONSTANTS]
+    colors = {}
+    for i, (op, name) in enumerate(nodes):
+        if op is None:
+            colors[i] = _CONSTANTS.get(name, 0)
+
+    count = _refine(nodes, variables, colors)
+    while count < len(variables):
+        classes = {}
+        for i in variables:
+            classes.setdefault(colors[i], []).append(i)
+        tied = min(c for c, members in classes.items() if len(members) > 1)
+        members = sorted(classes[tied], key=lambda i: repr(nodes[i][1]))
+        # individualizes the first member: the colors are doubled to make
+        # room for it
+        for i in variables:
+            colors[i] = 2*colors[i] + (1 if i == members[0] else 0)
+        new_count = _refine(nodes, variables, colors)
+        if new_count == count + 1 and len(members) > 2:
+            # nothing else was told apart, the rest of the class is most
+            # likely interchangeable: individualizes it at once
+            for i in variables:
+                colors[i] = (len(members) + 1)*colors[i]
+            for offset, i in enumerate(members[1:]):
+                colors[i] += offset
+            new_count = _refine(nodes, variables, colors)
+        count = new_count
+
+    renaming = {}
+    names = {}
+    for i in sorted(variables, key=lambda i: colors[i]):
+        name = 'x%d' % len(renaming)
+        renaming[name] = nodes[i][1]
+        names[nodes[i][1]] = name
+    return rename(P, names), renaming
+
+def rename(P, mapping):
+    """P with every variable named in mapping renamed to its image."""
+    def step(task):
+        P = task[0]
+        if P.atomic:
+            name = mapping.get(P.name, P.name)
+            return None, P if name == P.name else Prop(name)
+        op = P.get_op()
+        return [(x,) for x in P.get_terms()], lambda terms: Prop(op, *terms)
+    return postorder((P,), step)
@@ -0,0 +1,194 @@
+"""Preprocessing of conjunctions of clauses.
+
+preprocess rewrites the clauses (the disjunctions of literals, and the
+literals) among the terms of a conjunction with the classic rules of SAT
+preprocessors, over occurrence lists:
+
+- unit propagation: with a unit clause u, the clauses containing u are
+  dropped and ~u is removed from the others;
+- subsumption: a clause containing all the literals of another one is
+  dropped;
+- self-subsuming resolution: with clauses C | l and C | D | ~l, the
+  second one is strengthened to C | D;
+- pure literals, only if asked for: the clauses containing a literal
+  whose negation occurs nowhere are dropped.
+
+The result is equivalent to the argument (the unit clauses stay in it),
+except for the pure literal rule, which only keeps satisfiability. The
+units are also propagated into the other terms of the conjunction."""
+from proposition import Prop
+from instrument import instrumented
+
+def _clause(term):
+    """The literals of term if it is a clause (nested disjunctions
+    included), or None."""
+    if term.is_literal():
+        return [term]
+    if term.get_op() != '|':
+        return None
+    lits = []
+    stack = list(term.get_terms())
+    while stack:
+        x = stack.pop()
+        if x.is_literal():
+            lits.append(x)
+        elif x.get_op() == '|':
+            stack.extend(x.get_terms())
+        else:
+            return None
+    return lits
+
+def is_cnf(P):
+    """Whether P is a conjunction of clauses."""
+    if P.is_atomic() or P.get_op() != '&':
+        return False
+    return all(_clause(term) is not None for term in P.get_terms())
+
+@instrumented('preprocess_cnf')
+def preprocess(P, pure_literals=False):
+    """P rewritten as described in the module, or P itself if it is not a
+    conjunction or if nothing applies."""
+    from simplify import propagate_hypothesis, simplify_everywhere
+    if P.is_atomic() or P.get_op() != '&':
+        return P
+
+    # literals are numbered v and -v, for the variable v of every name
+    numbers = {}
+    atoms = [None]
+    def number(lit):
+        atom = lit if lit.is_atomic() else lit.get_terms()[0]
+        v = numbers.get(atom.name)
+        if v is None:
+            v = numbers[atom.name] = len(atoms)
+            atoms.append(atom)
+        return v if lit.is_atomic() else -v
+
+    # the terms of the nested conjunctions as well
+    terms = []
+    stack = list(P.get_terms())
+    while stack:
+        term = stack.pop()
+        if not term.is_atomic() and term.get_op() == '&':
+            stack.extend(term.get_terms())
+        else:
+            terms.append(term)
+
+    others = []
+    originals = []
+    clauses = []
+    for term in terms:
+        lits = _clause(term)
+        if lits is None or any(x.is_atomic() and x.name in [True, False] for x in lits):
+            others.append(term)
+            continue
+        clause = set(number(x) for x in lits)
+        if any(-l in clause for l in clause):
+            continue
+        originals.append(term)
+        clauses.append(clause)
+    changed = len(originals) + len(others) < len(terms) or len(terms) > len(P.get_terms())
+
+    alive = [True]*len(clauses)
+    modified = [False]*len(clauses)
+    occurrences = {}
+    for i, clause in enumerate(clauses):
+        for l in clause:
+            occurrences.setdefault(l, set()).add(i)
+
+    units = {}
+    todo_units = [i for i, c in enumerate(clauses) if len(c) == 1]
+    todo_subsume = list(range(len(clauses)))
+
+    def remove(i):
+        alive[i] = False
+        for l in clauses[i]:
+            occurrences[l].discard(i)
+
+    def strengthen(i, l):
+        """Removes l from the clause i."""
+        clauses[i].discard(l)
+        occurrences[l].discard(i)
+        modified[i] = True
+        if len(clauses[i]) == 1:
+            todo_units.append(i)
+        todo_subsume.append(i)
+
+    while todo_units or todo_subsume:
+        while todo_units:
+            i = todo_units.pop()
+            if not alive[i]:
+                continue
+            if not clauses[i]:
+                return Prop(False)
+            u = next(iter(clauses[i]))
+            if -u in units:
+                return Prop(False)
+            units[u] = True
+            remove(i)
+            changed = True
+            for j in list(occurrences.get(u, ())):
+                remove(j)
+            for j in list(occurrences.get(-u, ())):
+                if len(clauses[j]) == 1:
+                    return Prop(False)
+                strengthen(j, -u)
+
+        if todo_subsume:
+            i = todo_subsume.pop()
+            if not alive[i]:
+                continue
+            clause = clauses[i]
+            # subsumption, through the rarest literal of the clause
+            rarest = min(clause, key=lambda l: len(occurrences[l]))
+            for j in list(occurrences[rarest]):
+                if j != i and len(clauses[j]) >= len(clause) and clause <= clauses[j]:
+                    remove(j)
+                    changed = True
+            # self-subsuming resolution on every literal of the clause
+            for l in list(clause):
+                if not alive[i] or l not in clause or len(clause) == 1:
+                    break
+                rest = clause - set([l])
+                for j in list(occurrences.get(-l, ())):
+                    if j != i and len(clauses[j]) >= len(clause) and rest <= clauses[j]:
+                        strengthen(j, -l)
+                        changed = True
+
+    if pure_literals:
+        others_vars = set(v.name for term in others for v in term.var_stats())
+        pure = [l for l, occ in occurrences.items() if occ and not occurrences.get(-l)
+                and atoms[abs(l)].name not in others_vars]
+        for l in pure:
+            for j in list(occurrences[l]):
+                remove(j)
+                changed = True
+
+    if not changed:
+        return P
+
+    def literal(l):
+        return atoms[l] if l > 0 else Prop('~', atoms[-l])
+
+    unit_lits = [literal(u) for u in units]
+    terms = list(unit_lits)
+    for i, clause in enumerate(clauses):
+        if not alive[i]:
+            continue
+        if not modified[i]:
+            terms.append(originals[i])
+        elif len(clause) == 1:
+            terms.append(literal(next(iter(clause))))
+        else:
+            terms.append(Prop('|', *[literal(l) for l in clause]))
+    if unit_lits:
+        others = [simplify_everywhere(propagate_hypothesis(term, unit_lits)) for term in others]
+    for term in others:
+        if term == Prop(False):
+            return term
+        if term != Prop(True):
+            terms.append(term)
+    if not terms:
+        return Prop(True)
+    if len(terms) == 1:
+        return terms[0]
+    return Prop('&', *terms)
@@ -0,0 +1,319 @@
+"""Compact representation of very large propositions.
+
+A DAG stores propositions as nodes numbered from 0, in parallel typed
+arrays (from the array module) rather than as one Python object per
+node: the opcode of node i is ops[i], and its children are
+children[offsets[i]:offsets[i+1]], sorted and without repetition (the
+terms of a Prop are a set as well). The children of an atom hold the
+index of its name in the names table. Nodes are hash-consed, and always
+numbered after their children, so that increasing numbers are a
+topological order: the traversals below are single loops over arrays.
+
+    >> dag, root = DAG.from_prop(P)
+    >> dag.size(root) == P.size()
+    True
+    >> small, root = dag.simplify_basic(root)
+    >> Q = small.to_prop(root)
+
+Nodes 0 and 1 are the atoms False and True."""
+from array import array
+
+from proposition import Prop
+from memo import postorder
+
+ATOM = 0
+NOT = 1
+AND = 2
+OR = 3
+
+FALSE = 0
+TRUE = 1
+
+_OPCODES = {'~': NOT, '&': AND, '|': OR}
+_OPERS = {NOT: '~', AND: '&', OR: '|'}
+
+def _bytes(a):
+    if hasattr(a, 'tobytes'):
+        return a.tobytes()
+    return a.tostring()
+
+class DAG(object):
+    def __init__(self):
+        self.ops = array('b')
+        self.offsets = array('l', [0])
+        self.children = array('i')
+        self.names = []
+        self._name_index = {}
+        # bytes of the array (opcode, children...) -> node, while the DAG
+        # is built
+        self._unique = {}
+        # node -> node of its negation in negation normal form, when known
+        self._negations = {}
+        self.atom(False)
+        self.atom(True)
+
+    def __len__(self):
+        return len(self.ops)
+
+    def nbytes(self):
+        """Memory used by the arrays of the nodes."""
+        return sum([a.itemsize*len(a) for a in (self.ops, self.offsets, self.children)])
+
+    def freeze(self):
+        """Drops the unique table, which takes more memory than the nodes
+        themselves. No node can be added afterwards."""
+        self._unique = None
+
+    def _add(self, op, kids):
+        if self._unique is None:
+            raise NameError("The DAG is frozen.")
+        key = _bytes(array('i', [op] + kids))
+        i = self._unique.get(key)
+        if i is None:
+            i = len(self.ops)
+            self.ops.append(op)
+            self.children.extend(kids)
+            self.offsets.append(len(self.children))
+            self._unique[key] = i
+        return i
+
+    def atom(self, name):
+        """The node of the atom called name."""
+        # True and 1 are equal, but are different names
+        key = (name.__class__, name)
+        index = self._name_index.get(key)
+        if index is None:
+            index = self._name_index[key] = len(self.names)
+            self.names.append(name)
+        return self._add(ATOM, [index])
+
+    def node(self, op, kids):
+        """The node of the operation op (NOT, AND or OR) on the nodes
+        kids, without any rewriting."""
+        kids = sorted(set(kids))
+        if op not in _OPERS or not kids or op == NOT and len(kids) > 1:
+            raise NameError("Malformed node: "+str((op, kids)))
+        return self._add(op, kids)
+
+    def mk(self, op, kids):
+        """The node of op on kids, simplified like simplify_term does,
+        with the operations of the same kind flattened."""
+        if op == NOT:
+            k = kids[0]
+            if k <= TRUE:
+                return TRUE - k
+            if self.ops[k] == NOT:
+                return self.children[self.offsets[k]]
+            return self.node(NOT, [k])
+
+        unit, zero = (TRUE, FALSE) if op == AND else (FALSE, TRUE)
+        terms = set()
+        todo = list(kids)
+        while todo:
+            k = todo.pop()
+            if k == zero:
+                return zero
+            if k == unit:
+                continue
+            if self.ops[k] == op:
+                todo.extend(self.child_nodes(k))
+            else:
+                terms.add(k)
+        for k in terms:
+            if self.ops[k] == NOT and self.children[self.offsets[k]] in terms:
+                return zero
+            # a term and its negation in negation normal form, flattened
+            # or not
+            n = self._negations.get(k)
+            if n is not None and (n in terms or self.ops[n] == op and
+                                  all(c in terms for c in self.child_nodes(n))):
+                return zero
+        if not terms:
+            return unit
+        if len(terms) == 1:
+            return terms.pop()
+        return self.node(op, terms)
+
+    # read-only access
+
+    def op(self, i):
+        return self.ops[i]
+
+    def child_nodes(self, i):
+        """The children of the node i (empty for an atom)."""
+        if self.ops[i] == ATOM:
+            return self.children[0:0]
+        return self.children[self.offsets[i]:self.offsets[i+1]]
+
+    def name(self, i):
+        """The name of the atom i."""
+        if self.ops[i] != ATOM:
+            raise NameError("Not an atom: "+str(i))
+        return self.names[self.children[self.offsets[i]]]
+
+    def is_atomic(self, i):
+        return self.ops[i] == ATOM
+
+    def is_literal(self, i):
+        return self.ops[i] == ATOM or \
+               self.ops[i] == NOT and self.ops[self.children[self.offsets[i]]] == ATOM
+
+    def reachable(self, roots):
+        """The nodes below the nodes of roots, in increasing order: every
+        node comes after its children."""
+        if isinstance(roots, int):
+            roots = [roots]
+        ops, offsets, children = self.ops, self.offsets, self.children
+        seen = bytearray(len(ops))
+        stack = list(roots)
+        while stack:
+            i = stack.pop()
+            if seen[i]:
+                continue
+            seen[i] = 1
+            if ops[i] != ATOM:
+                stack.extend(children[offsets[i]:offsets[i+1]])
+        return [i for i in range(len(ops)) if seen[i]]
+
+    def size(self, root):
+        """Size of the proposition of root, as Prop.size counts it (the
+        shared subterms once per occurrence)."""
+        ops, offsets, children = self.ops, self.offsets, self.children
+        sizes = [0]*len(ops)
+        for i in self.reachable(root):
+            if ops[i] == ATOM:
+                sizes[i] = 1
+            else:
+                sizes[i] = 1 + sum([sizes[k] for k in children[offsets[i]:offsets[i+1]]])
+        return sizes[root]
+
+    def depth(self, root):
+        """Depth of the proposition of root, as Prop.depth counts it."""
+        ops, offsets, children = self.ops, self.offsets, self.children
+        depths = array('l', [0])*len(ops)
+        for i in self.reachable(root):
+            if self.is_literal(i):
+                depths[i] = 1
+            else:
+                depths[i] = 1 + max([depths[k] for k in children[offsets[i]:offsets[i+1]]])
+        return depths[root]
+
+    def var_stats(self, root):
+        """Maps the name of every atom to its number of [positive,
+        negative] occurrences, like Prop.var_stats."""
+        ops, offsets, children = self.ops, self.offsets, self.children
+        nodes = self.reachable(root)
+        # occurrences of every node, under an even and an odd number of
+        # negations, from the root down
+        positive = [0]*len(ops)
+        negative = [0]*len(ops)
+        positive[root] = 1
+        counts = {}
+        for i in reversed(nodes):
+            pos, neg = positive[i], negative[i]
+            if ops[i] == ATOM:
+                c = counts.setdefault(self.name(i), [0, 0])
+                c[0] += pos
+                c[1] += neg
+                continue
+            if ops[i] == NOT:
+                pos, neg = neg, pos
+            for k in children[offsets[i]:offsets[i+1]]:
+                positive[k] += pos
+                negative[k] += neg
+        return counts
+
+    def evaluate(self, root, assignment):
+        """Value of root under assignment, a dict mapping the name of
+        every variable to a boolean."""
+        ops, offsets, children = self.ops, self.offsets, self.children
+        values = bytearray(len(ops))
+        for i in self.reachable(root):
+            op = ops[i]
+            kids = children[offsets[i]:offsets[i+1]]
+            if op == ATOM:
+                name = self.names[kids[0]]
+                values[i] = name if i <= TRUE else bool(assignment[name])
+            elif op == NOT:
+                values[i] = not values[kids[0]]
+            elif op == AND:
+                values[i] = all([values[k] for k in kids])
+            else:
+                values[i] = any([values[k] for k in kids])
+        return bool(values[root])
+
+    # conversions
+
+    def add_prop(self, P):
+        """Adds P and its subterms, returning the node of P."""
+        def step(task):
+            P = task[0]
+            if P.atomic:
+                return None, self.atom(P.name)
+            op = _OPCODES[P.get_op()]
+            return [(x,) for x in P.get_terms()], lambda kids: self.node(op, kids)
+        return postorder((P,), step)
+
+    @classmethod
+    def from_prop(cls, P):
+        """Returns (dag, root): a new DAG holding P at the node root."""
+        dag = cls()
+        return dag, dag.add_prop(P)
+
+    def to_prop(self, root):
+        """The Prop of the node root, sharing the Prop of every node."""
+        ops, offsets, children = self.ops, self.offsets, self.children
+        props = [None]*len(ops)
+        for i in self.reachable(root):
+            kids = children[offsets[i]:offsets[i+1]]
+            if ops[i] == ATOM:
+                props[i] = Prop(self.names[kids[0]])
+            else:
+                props[i] = Prop(_OPERS[ops[i]], *[props[k] for k in kids])
+        return props[root]
+
+    def compact(self, roots):
+        """Returns (dag, new_roots): a new DAG holding only the nodes below
+        the nodes of roots."""
+        other = DAG()
+        new = array('l', [0])*len(self.ops)
+        for i in self.reachable(roots):
+            kids = self.children[self.offsets[i]:self.offsets[i+1]]
+            if self.ops[i] == ATOM:
+                new[i] = other.atom(self.names[kids[0]])
+            else:
+                new[i] = other.node(self.ops[i], [new[k] for k in kids])
+        return other, [new[i] for i in roots]
+
+    def simplify_basic(self, root):
+        """Returns (dag, new_root): the proposition of root in negation
+        normal form, with the rewritings of simplify_term and the
+        operations of the same kind flattened, in a new DAG, computed in
+        one pass over the nodes instead of one per rewriting. An operation
+        is also rewritten to a constant if it has a term and the terms of
+        its negation. This is close to simplify.simplify_basic, but not
+        always the same proposition: the rewritings are applied in
+        another order, and complementary terms are also found once
+        flattened."""
+        out = DAG()
+        ops, offsets, children = self.ops, self.offsets, self.children
+        # nodes of out for every node, and for its negation
+        pos = array('l', [0])*len(ops)
+        neg = array('l', [0])*len(ops)
+        for i in self.reachable(root):
+            op = ops[i]
+            kids = children[offsets[i]:offsets[i+1]]
+            if op == ATOM:
+                pos[i] = out.atom(self.names[kids[0]])
+                neg[i] = out.mk(NOT, [pos[i]])
+            elif op == NOT:
+                pos[i] = neg[kids[0]]
+                neg[i] = pos[kids[0]]
+            else:
+                dual = OR if op == AND else AND
+                pos[i] = out.mk(op, [pos[k] for k in kids])
+                neg[i] = out.mk(dual, [neg[k] for k in kids])
+            out._negations[pos[i]] = neg[i]
+            out._negations[neg[i]] = pos[i]
+        dag, roots = out.compact([pos[root]])
+        return dag, roots[0]
@@ -0,0 +1,165 @@
+"""Reading and writing propositions in the DIMACS CNF format.
+
+    >> P = read_dimacs('uf20-01.cnf')
+    >> with open('out.cnf', 'w') as out:
+    ..     write_dimacs(simplify(P), out)
+
+Variable n is read as the atom named 'x<n>', unless a names mapping is
+given or the file declares the name of its variables in comment lines of
+the form "c var <n> <name>", as written by write_dimacs. Files with a
+"p dnf" header, as write_dimacs writes disjunctions of conjunctions,
+are read back as such.
+
+The module is not called io, as it would shadow the standard library
+module for the other modules of the package."""
+import mmap
+import os
+import stat
+
+from proposition import Prop
+import dag as dag_
+
+try:
+    _string = basestring
+except NameError:
+    _string = str
+
+def _text(token):
+    if isinstance(token, _string):
+        return token
+    return token.decode('utf-8')
+
+def parse_dimacs(lines, names=None, dag=None):
+    """Builds the conjunction of the clauses of a DIMACS CNF file given
+    as an iterable of lines (str or bytes), or the disjunction of its
+    conjunctions if its header is "p dnf". names maps a variable number
+    to the name of its atom (a dict, a list or a function). If dag (a
+    dag.DAG) is given, the clauses are added to it and the node of the
+    conjunction is returned instead of a Prop."""
+    if dag is None:
+        atom, neg = Prop, lambda x: Prop('~', x)
+        disj = lambda terms: Prop('|', *terms)
+        conj = lambda terms: Prop('&', *terms)
+        true, false = Prop(True), Prop(False)
+    else:
+        atom, neg = dag.atom, lambda x: dag.node(dag_.NOT, [x])
+        disj = lambda terms: dag.node(dag_.OR, terms)
+        conj = lambda terms: dag.node(dag_.AND, terms)
+        true, false = dag_.TRUE, dag_.FALSE
+    # operation of the lines and of the file, and their empty values
+    inner, outer, empty, whole = disj, conj, false, true
+    declared = {}
+    atoms = {}
+    literals = {}
+
+    def literal(n):
+        lit = literals.get(n)
+        if lit is None:
+            v = abs(n)
+            if v not in atoms:
+                if names is not None:
+                    name = names(v) if callable(names) else names[v]
+                else:
+                    name = declared.get(v, 'x%d' % v)
+                atoms[v] = atom(name)
+            lit = atoms[v] if n > 0 else neg(atoms[v])
+            literals[n] = lit
+        return lit
+
+    clauses = []
+    clause = []
+    for line in lines:
+        tokens = line.split()
+        if not tokens:
+            continue
+        head = _text(tokens[0])
+        if head == 'c':
+            if len(tokens) >= 4 and _text(tokens[1]) == 'var':
+                declared[int(tokens[2])] = _text(tokens[3])
+            continue
+        if head == 'p':
+            form = _text(tokens[1]) if len(tokens) >= 2 else None
+            if form == 'dnf':
+                inner, outer, empty, whole = conj, disj, true, false
+            elif form != 'cnf':
+                raise NameError("Not a DIMACS CNF header: "+_text(line).strip())
+            continue
+        if head == '%':
+            # end marker of the SATLIB benchmarks
+            break
+        for token in tokens:
+            n = int(token)
+            if n == 0:
+                clauses.append(inner(clause) if clause else empty)
+                clause = []
+            else:
+                clause.append(literal(n))
+    if clause:
+        clauses.append(inner(clause))
+
+    if not clauses:
+        return whole
+    return outer(clauses)
+
+def read_dimacs(source, names=None, dag=None):
+    """Reads a DIMACS CNF file (a path or a file object), through a
+    memory map if it is a regular file with a descriptor, line by line
+    otherwise. See parse_dimacs."""
+    if isinstance(source, _string):
+        with open(source, 'rb') as f:
+            return read_dimacs(f, names, dag)
+    try:
+        fd = source.fileno()
+    except (AttributeError, IOError, ValueError):
+        # io.UnsupportedOperation (StringIO, BytesIO) is an IOError and a
+        # ValueError
+        fd = None
+    if fd is None or not stat.S_ISREG(os.fstat(fd).st_mode) or \
+       os.fstat(fd).st_size == 0:
+        # mmap cannot map empty files nor streams
+        return parse_dimacs(source, names, dag)
+    buf = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    try:
+        return parse_dimacs(iter(buf.readline, b''), names, dag)
+    finally:
+        buf.close()
+
+def _literals(P, oper):
+    """The literals of P seen as an oper-operation of literals."""
+    if P.is_literal():
+        return [P]
+    if P.get_op() != oper or not all(x.is_literal() for x in P.get_terms()):
+        raise NameError("Not a "+("conjunction" if oper == '&' else "disjunction")+
+                        " of literals: "+repr(P))
+    return P.get_terms()
+
+def write_dimacs(P, out, form='cnf'):
+    """Writes P to the file-like out, in the DIMACS CNF format if form is
+    'cnf', or in the same format with a 'p dnf' header and one
+    conjunction per line if form is 'dnf'. P must already be in that
+    form. The names of the variables are declared in comments."""
+    outer, inner = ('&', '|') if form == 'cnf' else ('|', '&')
+    if P.is_atomic() and P.name in [True, False]:
+        # the empty conjunction (resp. disjunction), or the empty clause
+        lines = [] if P.name == (outer == '&') else [[]]
+    elif P.is_literal() or P.get_op() == inner:
+        lines = [_literals(P, inner)]
+    else:
+        if P.get_op() != outer:
+            raise NameError("Not in "+form.upper()+": "+repr(P))
+        lines = [_literals(term, inner) for term in P.get_terms()]
+
+    numbers = {}
+    for lits in lines:
+        for lit in lits:
+            v = lit if lit.is_atomic() else lit.get_terms()[0]
+            if v not in numbers:
+                numbers[v] = len(numbers) + 1
+
+    for v in sorted(numbers, key=lambda v: numbers[v]):
+        out.write('c var %d %s\n' % (numbers[v], v.name))
+    out.write('p %s %d %d\n' % (form, len(numbers), len(lines)))
+    for lits in lines:
+        out.write(' '.join([str(numbers[lit]) if lit.is_atomic() else
+                            str(-numbers[lit.get_terms()[0]]) for lit in lits] + ['0']))
+        out.write('\n')
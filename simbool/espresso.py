@@ -0,0 +1,342 @@
+"""Two-level minimization, after the Espresso heuristics.
+
+    >> minimize_sop(P)      # a near-minimal disjunction of conjunctions
+    >> minimize_pos(P)      # a near-minimal conjunction of disjunctions
+
+Unlike simplify, which may nest operations to any depth, these give
+two-level forms, with as few terms (and then literals) as the heuristics
+find. They do not enumerate the minterms nor the prime implicants, so
+they handle dozens of variables and hundreds of terms, where exact
+methods (Quine-McCluskey) do not; a few seconds are then common, as
+everything is done in Python.
+
+Cubes (conjunctions of literals) are integers with two bits per
+variable, as in Espresso: for the i-th variable, bit 2i allows it to be
+false and bit 2i+1 allows it to be true. A literal clears one of the two
+bits, both set means that the variable does not occur, and both clear
+makes the cube empty. Covers (disjunctions of cubes) are lists of cubes.
+The ON-set cover of the proposition (where it is true) and the OFF-set
+cover (where it is false, the complement of the former) are computed
+from its negation normal form, or from each other by the unate recursive
+complement. Then the cover is improved until its cost stops decreasing:
+
+- expand turns every cube into a prime implicant, by removing literals
+  as long as it meets no cube of the OFF-set, and drops the cubes it
+  comes to contain;
+- irredundant drops the cubes covered by the others (the cofactor of the
+  others by the cube is a tautology);
+- reduce shrinks every cube to the smallest one still needed to cover
+  what the others do not (the smallest cube containing the complement
+  of their cofactor, found without the complement itself), so that the
+  next expand can take another direction.
+
+When the OFF-set cover is too large, expand checks instead that the ON-set
+cover still covers the cube, which is slower."""
+from functools import reduce
+
+from proposition import Prop
+from memo import postorder
+import truthtable
+
+# bound on the number of cubes of the covers built from propositions
+MAX_CUBES = 10000
+
+class _Space(object):
+    """The cubes over n variables."""
+
+    def __init__(self, n):
+        self.n = n
+        self.full = (1 << 2*n) - 1
+        # the low bit of every variable
+        self.low = self.full // 3
+
+    def empty(self, c):
+        return (c | (c >> 1)) & self.low != self.low
+
+    def literal(self, v, value):
+        """The cube of the v-th variable, or of its negation."""
+        return self.full ^ (1 << (2*v + (0 if value else 1)))
+
+    def variables(self, c):
+        """The variables occurring in c."""
+        return [v for v in range(self.n) if (c >> 2*v) & 3 != 3]
+
+    def cost(self, F):
+        return len(F), sum(len(self.variables(c)) for c in F)
+
+    def cofactor(self, F, c):
+        """The cofactor of F by the cube c."""
+        free = self.full ^ c
+        return [f | free for f in F if not self.empty(f & c)]
+
+    def contained(self, F):
+        """F without the cubes contained in others (and the duplicates)."""
+        F = sorted(set(F), key=lambda c: -bin(c).count('1'))
+        res = []
+        for c in F:
+            if not any(c & ~d == 0 for d in res):
+                res.append(c)
+        return res
+
+    def _literals(self, F):
+        """(positive, negative): the masks of the low bits of the variables
+        occurring positively, and negatively, in each cube of F."""
+        full, low = self.full, self.low
+        return [~c & low for c in F], [(full ^ c) >> 1 & low for c in F]
+
+    def _split(self, F, binate_only):
+        """The variable occurring in the most cubes of F, among the ones
+        occurring both positively and negatively if binate_only, or
+        None."""
+        positive, negative = self._literals(F)
+        candidates = reduce(lambda a, b: a | b, positive, 0)
+        if binate_only:
+            candidates &= reduce(lambda a, b: a | b, negative, 0)
+        if not candidates and not binate_only:
+            # only negative literals
+            candidates = reduce(lambda a, b: a | b, negative, 0)
+        counts = {}
+        for p, m in zip(positive, negative):
+            m = (p | m) & candidates
+            while m:
+                bit = m & -m
+                m ^= bit
+                counts[bit] = counts.get(bit, 0) + 1
+        if not counts:
+            return None
+        best = max(counts, key=lambda bit: (counts[bit], -bit))
+        return best.bit_length() // 2
+
+    def tautology(self, F):
+        if not F:
+            return False
+        if self.full in F:
+            return True
+        v = self._split(F, True)
+        if v is None:
+            # a unate cover is a tautology only if it has the full cube
+            return False
+        return self.tautology(self.cofactor(F, self.literal(v, True))) and \
+               self.tautology(self.cofactor(F, self.literal(v, False)))
+
+    def complement(self, F, limit=None):
+        """A cover of the complement of F, or None if it has more than
+        limit cubes."""
+        if not F:
+            return [self.full]
+        if self.full in F:
+            return []
+        if len(F) == 1:
+            c = F[0]
+            return [self.full ^ (c & (3 << 2*v)) for v in self.variables(c)]
+        v = self._split(F, True)
+        if v is None:
+            v = self._split(F, False)
+        x1, x0 = self.literal(v, True), self.literal(v, False)
+        c1 = self.complement(self.cofactor(F, x1), limit)
+        if c1 is None:
+            return None
+        c0 = self.complement(self.cofactor(F, x0), limit)
+        if c0 is None:
+            return None
+        both = set(c1) & set(c0)
+        res = list(both)
+        res += [c & x1 for c in c1 if c not in both]
+        res += [c & x0 for c in c0 if c not in both]
+        if limit is not None and len(res) > limit:
+            return None
+        return res
+
+    def expand(self, F, R, on):
+        """Every cube of F made prime, the cubes contained in an expanded
+        one being dropped. A literal is removed from a cube as long as the
+        cube meets no cube of the OFF-set cover R or, if R is None, as long
+        as it is covered by the ON-set cover on."""
+        # variables free in many cubes are removed first, as the expanded
+        # cube then contains more of them
+        free = [0]*self.n
+        for c in F:
+            for v in range(self.n):
+                if (c >> 2*v) & 3 == 3:
+                    free[v] += 1
+        F = sorted(F, key=lambda c: -bin(c).count('1'))
+        res = []
+        for c in F:
+            if any(c & ~d == 0 for d in res):
+                continue
+            order = sorted(self.variables(c), key=lambda v: -free[v])
+            if R is None:
+                # c is covered already: only the half added by raising a
+                # variable has to be
+                for v in order:
+                    bits = 3 << 2*v
+                    if self.tautology(self.cofactor(on, c ^ bits)):
+                        c |= bits
+            else:
+                # the variables whose literals make c and each cube of R
+                # disjoint: a literal can be removed unless it is the only
+                # one for some cube of R
+                conflicts = []
+                for r in R:
+                    x = c & r
+                    conflicts.append(~(x | (x >> 1)) & self.low)
+                for v in order:
+                    bit = 1 << 2*v
+                    if bit in conflicts:
+                        continue
+                    c |= 3 << 2*v
+                    conflicts = [m & ~bit for m in conflicts]
+            res = [d for d in res if d & ~c != 0]
+            res.append(c)
+        return res
+
+    def irredundant(self, F):
+        """F without the cubes covered by the other ones, trying the
+        smallest cubes first."""
+        F = sorted(F, key=lambda c: bin(c).count('1'))
+        keep = list(F)
+        for c in F:
+            others = [d for d in keep if d != c]
+            if self.tautology(self.cofactor(others, c)):
+                keep = others
+        return keep
+
+    def complement_supercube(self, F, known=0):
+        """The smallest cube containing the complement of F, or None if
+        that is empty (0 is a cube, the full one when there are no
+        variables). Only the parts not in the cube known are computed (the
+        others may be missing from the result), as they are already known
+        to be in it."""
+        if not F:
+            return self.full
+        if self.full in F:
+            return None
+        if known == self.full:
+            return None if self.tautology(F) else self.full
+        v = self._split(F, True)
+        if v is None:
+            # F is unate: the complement contains the point where every
+            # literal of F is false, and whatever a single variable can be
+            # changed to from there, unless F has it as a single literal
+            res = self.full
+            for c in F:
+                vs = self.variables(c)
+                if len(vs) == 1:
+                    res &= self.full ^ (c & (3 << 2*vs[0]))
+            return res
+        # v is free in both cofactors, so their results have both its bits
+        bits = 3 << 2*v
+        x1, x0 = self.literal(v, True), self.literal(v, False)
+        s1 = self.complement_supercube(self.cofactor(F, x1), known | bits)
+        s0 = self.complement_supercube(self.cofactor(F, x0),
+                                       known | bits | (s1 if s1 is not None else 0))
+        if s1 is None:
+            return s0 & x0 if s0 is not None else None
+        if s0 is None:
+            return s1 & x1
+        return s1 | s0
+
+    def reduce(self, F):
+        """Every cube of F reduced to the smallest cube containing the part
+        of it that the other cubes do not cover."""
+        res = sorted(F, key=lambda c: -bin(c).count('1'))
+        for i in range(len(res)):
+            c = res[i]
+            others = [d for d in res[:i] + res[i+1:] if d is not None]
+            supercube = self.complement_supercube(self.cofactor(others, c))
+            res[i] = c & supercube if supercube is not None else None
+        return [c for c in res if c is not None and not self.empty(c)]
+
+    def minimize(self, on, off):
+        """A near-minimal cover of the function of the ON-set cover on,
+        whose OFF-set cover is off (or None if it is too large)."""
+        F = self.irredundant(self.expand(on, off, on))
+        cost = self.cost(F)
+        while True:
+            G = self.irredundant(self.expand(self.reduce(F), off, on))
+            if self.cost(G) >= cost:
+                return F
+            F, cost = G, self.cost(G)
+
+def _cover(P, space, index):
+    """The cubes of P, in negation normal form, by distributing the
+    conjunctions over the disjunctions, or None if they are more than
+    MAX_CUBES."""
+    def step(task):
+        P = task[0]
+        if P.is_literal():
+            atom = P if P.is_atomic() else P.get_terms()[0]
+            if atom.name is True or atom.name is False:
+                value = atom.name if P.is_atomic() else not atom.name
+                return None, [space.full] if value else []
+            return None, [space.literal(index[atom.name], P.is_atomic())]
+        op = P.get_op()
+        def combine(covers):
+            if any(c is None for c in covers):
+                return None
+            if op == '|':
+                res = [c for cover in covers for c in cover]
+            else:
+                res = [space.full]
+                for cover in sorted(covers, key=len):
+                    res = [a & b for a in res for b in cover if not space.empty(a & b)]
+                    if len(res) > MAX_CUBES:
+                        return None
+                    res = space.contained(res)
+            if len(res) > MAX_CUBES:
+                return None
+            return res
+        return [(x,) for x in P.get_terms()], combine
+    return postorder((P,), step)
+
+def _covers(P):
+    """(space, variables, on, off): the ON-set cover of P, and its OFF-set
+    cover, or None if that has more than MAX_CUBES cubes."""
+    from simplify import simplify_basic
+    vars_ = truthtable.variables(P)
+    space = _Space(len(vars_))
+    index = dict((v.name, i) for i, v in enumerate(vars_))
+    on = _cover(simplify_basic(P), space, index)
+    if on is not None:
+        on = space.contained(on)
+        off = space.complement(on, MAX_CUBES)
+    else:
+        off = _cover(simplify_basic(Prop('~', P)), space, index)
+        if off is None:
+            raise NameError("Too many cubes to minimize: "+repr(P))
+        on = space.complement(space.contained(off))
+    return space, vars_, on, off
+
+def _cube_prop(space, vars_, c, negate=False):
+    literals = []
+    for v in space.variables(c):
+        positive = (c >> 2*v) & 3 == 2
+        literals.append(vars_[v] if positive != negate else Prop('~', vars_[v]))
+    op = '|' if negate else '&'
+    if not literals:
+        return Prop(not negate)
+    if len(literals) == 1:
+        return literals[0]
+    return Prop(op, *literals)
+
+def minimize_sop(P):
+    """A near-minimal disjunction of conjunctions of literals equivalent
+    to P."""
+    space, vars_, on, off = _covers(P)
+    F = space.minimize(on, off)
+    if not F:
+        return Prop(False)
+    if len(F) == 1:
+        return _cube_prop(space, vars_, F[0])
+    return Prop('|', *[_cube_prop(space, vars_, c) for c in F])
+
+def minimize_pos(P):
+    """A near-minimal conjunction of disjunctions of literals equivalent
+    to P: the negation of the minimal disjunction of conjunctions of ~P."""
+    space, vars_, on, off = _covers(Prop('~', P))
+    F = space.minimize(on, off)
+    if not F:
+        return Prop(True)
+    if len(F) == 1:
+        return _cube_prop(space, vars_, F[0], negate=True)
+    return Prop('&', *[_cube_prop(space, vars_, c, negate=True) for c in F])
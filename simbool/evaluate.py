@@ -0,0 +1,127 @@
+"""Evaluation of propositions against assignments.
+
+A proposition is compiled (with the built-in compile()) into two Python
+functions taking one argument per variable: a scalar one for a single
+assignment, and a vectorized one computing on whole NumPy boolean
+columns. Each distinct subterm is computed once, into a local variable.
+
+    >> check = ((A & ~B) | C).compile()
+    >> check({'A': a_column, 'B': b_column, 'C': c_column})
+    >> check.evaluate({'A': True, 'B': False, 'C': False})
+    True
+"""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from memo import LRUCache, postorder
+
+# evaluators of Prop.evaluate, keyed by proposition
+_compiled = LRUCache(256)
+
+def _variables(P):
+    names = set()
+    for v in P.var_stats():
+        if v.name not in [True, False]:
+            names.add(v.name)
+    return sorted(names, key=str)
+
+def _source(P, variables, vectorized):
+    """Source of a function of the variables (then, if vectorized, of the
+    constant columns) computing P, one line per distinct subterm."""
+    args = dict((n, 'c%d' % i) for i, n in enumerate(variables))
+    lines = []
+    if vectorized:
+        and_, or_, not_ = ' & ', ' | ', '~'
+        true, false = '_ones', '_zeros'
+    else:
+        and_, or_, not_ = ' and ', ' or ', 'not '
+        true, false = 'True', 'False'
+
+    def line(expr):
+        name = 't%d' % len(lines)
+        lines.append('    %s = %s' % (name, expr))
+        return name
+
+    def emit(task):
+        P = task[0]
+        if P.is_atomic():
+            if P.name == True:
+                return None, true
+            if P.name == False:
+                return None, false
+            return None, args[P.name]
+        if P.get_op() == '~':
+            return [(P.get_terms()[0],)], lambda subs: line(not_ + subs[0])
+        op = and_ if P.get_op() == '&' else or_
+        return [(x,) for x in P.get_terms()], lambda subs: line(op.join(subs))
+
+    res = postorder((P,), emit)
+    params = [args[n] for n in variables]
+    if vectorized:
+        params += ['_ones', '_zeros']
+    return 'def _evaluate(%s):\n%s\n    return %s\n' % \
+           (', '.join(params), '\n'.join(lines), res)
+
+class Evaluator(object):
+    """Compiled form of a proposition. Calling it on a batch of
+    assignments evaluates them all at once: the batch is either a dict
+    mapping every variable name to a column (a sequence of booleans), or
+    a 2-D array with one row per assignment and one column per variable,
+    in the order of self.variables. The result is a NumPy boolean array,
+    or a list of booleans when NumPy is not installed."""
+
+    def __init__(self, P, variables=None):
+        if variables is None:
+            variables = _variables(P)
+        self.variables = list(variables)
+        self.source = _source(P, self.variables, False)
+        self._scalar = self._compile(self.source)
+        if numpy is not None:
+            self.vectorized_source = _source(P, self.variables, True)
+            self._vector = self._compile(self.vectorized_source)
+
+    def _compile(self, source):
+        namespace = {}
+        exec(compile(source, '<simbool>', 'exec'), namespace)
+        return namespace['_evaluate']
+
+    def _columns(self, batch):
+        if isinstance(batch, dict):
+            return [batch[n] for n in self.variables]
+        if numpy is not None:
+            batch = numpy.asarray(batch, dtype=bool)
+            return [batch[:, i] for i in range(len(self.variables))]
+        return [[row[i] for row in batch] for i in range(len(self.variables))]
+
+    def __call__(self, batch):
+        columns = self._columns(batch)
+        if isinstance(batch, dict) and not columns:
+            raise NameError("Cannot size a batch without columns.")
+        n = len(columns[0]) if columns else len(batch)
+        if numpy is None:
+            rows = zip(*columns) if columns else [()]*n
+            return [bool(self._scalar(*row)) for row in rows]
+        columns = [numpy.asarray(c, dtype=bool) for c in columns]
+        res = self._vector(*(columns + [numpy.ones(n, dtype=bool),
+                                        numpy.zeros(n, dtype=bool)]))
+        return numpy.asarray(res, dtype=bool)
+
+    def evaluate(self, row):
+        """Value under one assignment: a dict from variable names to
+        booleans, or a sequence ordered like self.variables."""
+        if isinstance(row, dict):
+            row = [row[n] for n in self.variables]
+        return bool(self._scalar(*row))
+
+def compile_prop(P, variables=None):
+    return Evaluator(P, variables)
+
+def evaluate(P, row):
+    """Value of P under the assignment row (see Evaluator.evaluate)."""
+    evaluator = _compiled.get(P)
+    if evaluator is None:
+        evaluator = Evaluator(P)
+        _compiled.put(P, evaluator)
+    return evaluator.evaluate(row)
@@ -0,0 +1,207 @@
+"""Bounded memoization of the pure rewriting passes.
+
+Every memoized pass owns an LRUCache registered under the pass name, so
+that the size bound and the hit/miss statistics can be inspected and
+tuned per pass."""
+
+DEFAULT_MAXSIZE = 1 << 14
+
+# Link layout of the circular doubly linked list kept by LRUCache.
+_PREV, _NEXT, _KEY, _VALUE = 0, 1, 2, 3
+
+_missing = object()
+# cached in place of a result that is the (first) argument itself, so
+# that a pass leaving its argument unchanged keeps returning that very
+# object, and not an equal one cached earlier
+_same = object()
+
+class LRUCache(object):
+    """Mapping with a size bound and least-recently-used eviction.
+    maxsize == 0 disables the cache, maxsize None makes it unbounded."""
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.clear()
+
+    def clear(self):
+        self._map = {}
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._map)
+
+    def __contains__(self, key):
+        return key in self._map
+
+    def get(self, key, default=None):
+        link = self._map.get(key)
+        if link is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        # move to the most recently used end
+        prev, next_ = link[_PREV], link[_NEXT]
+        prev[_NEXT] = next_
+        next_[_PREV] = prev
+        root = self._root
+        last = root[_PREV]
+        last[_NEXT] = root[_PREV] = link
+        link[_PREV] = last
+        link[_NEXT] = root
+        return link[_VALUE]
+
+    def put(self, key, value):
+        if self.maxsize == 0:
+            return
+        link = self._map.get(key)
+        if link is not None:
+            link[_VALUE] = value
+            return
+        root = self._root
+        if self.maxsize is not None and len(self._map) >= self.maxsize:
+            # recycle the least recently used link
+            oldest = root[_NEXT]
+            del self._map[oldest[_KEY]]
+            root[_NEXT] = oldest[_NEXT]
+            oldest[_NEXT][_PREV] = root
+            self.evictions += 1
+        last = root[_PREV]
+        link = [last, root, key, value]
+        last[_NEXT] = root[_PREV] = link
+        self._map[key] = link
+
+    def pop(self, key, default=None):
+        """Removes key, returning its value, or default if it is absent."""
+        link = self._map.pop(key, None)
+        if link is None:
+            return default
+        link[_PREV][_NEXT] = link[_NEXT]
+        link[_NEXT][_PREV] = link[_PREV]
+        return link[_VALUE]
+
+    def resize(self, maxsize):
+        self.maxsize = maxsize
+        if maxsize is None:
+            return
+        root = self._root
+        while len(self._map) > maxsize:
+            oldest = root[_NEXT]
+            del self._map[oldest[_KEY]]
+            root[_NEXT] = oldest[_NEXT]
+            oldest[_NEXT][_PREV] = root
+            self.evictions += 1
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'size': len(self._map),
+                'maxsize': self.maxsize}
+
+caches = {}
+
+# number of tasks expanded by postorder since the start, for the
+# instrumentation of the passes
+visited = 0
+
+def cache_for(name):
+    """The cache of the pass called name, registered on first use."""
+    return caches.setdefault(name, LRUCache())
+
+def memoized(name, key=None):
+    """Decorator caching the results of a pure pass in caches[name].
+    key maps the call arguments to the cache key; by default the
+    positional arguments themselves are used."""
+    cache = cache_for(name)
+
+    def decorate(f):
+        def wrapper(*args):
+            if cache.maxsize == 0:
+                return f(*args)
+            k = args if key is None else key(*args)
+            res = cache.get(k, _missing)
+            if res is _missing:
+                res = f(*args)
+                cache.put(k, _same if res is args[0] else res)
+            elif res is _same:
+                return args[0]
+            return res
+        wrapper.__name__ = f.__name__
+        wrapper.__doc__ = f.__doc__
+        wrapper.cache = cache
+        return wrapper
+    return decorate
+
+def postorder(task, expand, cache=None):
+    """Evaluates a recursive pass with an explicit stack instead of
+    Python recursion, so that the depth of the propositions is not
+    limited by the interpreter stack.
+
+    Tasks are tuples whose first item is the proposition rewritten (the
+    argument tuples of the pass). expand(task) returns (None, result)
+    when the result is known right away, or (subtasks, combine) when it
+    is combine(results of subtasks). Results are looked up in and stored
+    into cache (an LRUCache keyed by tasks), or into a dict local to the
+    call if there is none, so that shared subtasks are expanded once."""
+    global visited
+    if cache is not None and cache.maxsize == 0:
+        cache = None
+    if cache is None:
+        cache = _LocalCache()
+    get, put = cache.get, cache.put
+    out = [None]
+    # (task, list and index to store its result at), or
+    # (task, None, frame) once the subtasks of task are pushed
+    stack = [(task, out, 0)]
+    pop, push, extend = stack.pop, stack.append, stack.extend
+    expanded = 0
+    while stack:
+        t, dest, i = pop()
+        if dest is None:
+            combine, subs, dest, i = i
+            res = combine(subs)
+        else:
+            res = get(t, _missing)
+            if res is not _missing:
+                dest[i] = t[0] if res is _same else res
+                continue
+            subtasks, combine = expand(t)
+            expanded += 1
+            if subtasks is not None:
+                subs = [None]*len(subtasks)
+                push((t, None, (combine, subs, dest, i)))
+                extend([(s, subs, j) for j, s in enumerate(subtasks)])
+                continue
+            res = combine
+        put(t, _same if res is t[0] else res)
+        dest[i] = res
+    visited += expanded
+    return out[0]
+
+class _LocalCache(dict):
+    maxsize = None
+
+    def put(self, key, value):
+        self[key] = value
+
+def set_cache_size(maxsize, name=None):
+    """Bounds the cache of the pass called name, or of every pass.
+    0 disables caching, None removes the bound."""
+    for n in ([name] if name is not None else caches.keys()):
+        caches[n].resize(maxsize)
+
+def clear_caches():
+    for cache in caches.values():
+        cache.clear()
+        cache.reset_stats()
+
+def cache_stats():
+    """Returns {pass name: {'hits', 'misses', 'evictions', 'size', 'maxsize'}}."""
+    return dict((n, c.stats()) for n, c in caches.items())
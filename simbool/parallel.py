@@ -0,0 +1,125 @@
+"""Parallel evaluation of the hypothesis candidates of ultra_simplify.
+
+The candidates of one order are independent, so they are spread over a
+pool of worker processes. The workers share the best size found so far,
+and only send a candidate back if it ties or beats it. Every candidate
+is evaluated in full: the cutoff of the serial search (see
+simplify.BOUND_SLACK) is not applied, since the best size it would
+compare to depends on the timing of the workers. The pool thus returns
+the candidate the serial search picks without the cutoff (the default),
+whatever the number of workers and their timing, unless a deadline
+stops the workers before they are done."""
+import multiprocessing
+
+from proposition import to_bytes, from_bytes_all
+from simplify import hypo_n, ultra_simplify, Budget, OutOfBudget
+
+# best size found so far, inherited by the workers
+_best = None
+
+def _init_worker(best):
+    global _best
+    _best = best
+
+def _evaluate(task):
+    P, candidates, limit, end = task
+    res = []
+    found = []
+    complete = True
+    for index, vars_ in candidates:
+        try:
+            c = hypo_n(P, vars_, None, end)
+        except OutOfBudget:
+            complete = False
+            break
+        size = c.size()
+        if size >= limit:
+            continue
+        with _best.get_lock():
+            if size > _best.value:
+                continue
+            _best.value = size
+        res.append((size, index))
+        found.append(c)
+    # the candidates share most of their subterms, which a single table
+    # sends once
+    return res, to_bytes(*found), complete
+
+def _ultra_simplify(task):
+    P, depth, end, max_steps = task
+    budget = Budget(max_steps=max_steps, end=end)
+    try:
+        res = ultra_simplify(P, depth, None, budget)
+    except OutOfBudget:
+        res = None
+    return res, budget.steps, budget.exhausted
+
+class HypothesisPool(object):
+    """A pool of processes evaluating case splits for ultra_simplify.
+    It is meant to be created once and reused across calls, e.g.
+
+        pool = HypothesisPool(8)
+        try:
+            res = ultra_simplify(P, 2, pool)
+        finally:
+            pool.close()
+    """
+
+    def __init__(self, workers=None, min_candidates=None):
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        self.workers = workers
+        # below this many candidates, the serial search is faster
+        self.min_candidates = min_candidates if min_candidates is not None \
+                              else 2*workers
+        self._best = multiprocessing.Value('l', 0)
+        self._pool = multiprocessing.Pool(workers, _init_worker, (self._best,))
+
+    def worth(self, candidates):
+        return len(candidates) >= self.min_candidates
+
+    def best_candidate(self, P, candidates, end=None):
+        """Same as simplify.best_candidate(P, candidates), without the
+        cutoff, as (candidate, complete). Past end (a time.time() value),
+        the workers stop, complete is False, and the candidate is the
+        best of those they had evaluated."""
+        limit = P.size()
+        self._best.value = limit
+        # interleaved chunks, since the cost of a candidate depends on
+        # its variables
+        indexed = list(enumerate(candidates))
+        chunks = self.workers*4
+        tasks = [(P, indexed[i::chunks], limit, end) for i in range(chunks)
+                 if indexed[i::chunks]]
+
+        best = None
+        complete = True
+        for res, data, done in self._pool.imap_unordered(_evaluate, tasks):
+            complete = complete and done
+            for (size, index), c in zip(res, from_bytes_all(data)):
+                if best is None or (size, index) < best[:2]:
+                    best = (size, index, c)
+        if best is None:
+            return None, complete
+        return best[2], complete
+
+    def ultra_simplify_all(self, props, depth, end=None, max_steps=None):
+        """Returns (results, steps, exhausted): [ultra_simplify(P, depth) for
+        P in props], one P per worker, each within the deadline end (a
+        time.time() value) and max_steps case splits if given, the number
+        of case splits they made, and whether any ran out of budget (its
+        result is then None unless it had improved P)."""
+        res = self._pool.map(_ultra_simplify, [(P, depth, end, max_steps)
+                                               for P in props], 1)
+        return ([x for x, _, _ in res], sum([n for _, n, _ in res]),
+                any([out for _, _, out in res]))
+
+    def close(self):
+        self._pool.terminate()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
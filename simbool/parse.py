@@ -0,0 +1,143 @@
+"""Parser for propositions written as Prop.__repr__ prints them.
+
+    >> parse('~A | (C & B)')
+    ~A | (C & B)
+
+Operators, by decreasing precedence: ~ (negation), - (A - B is A & ~B),
+& (conjunction), | (disjunction) and > (implication, A > B is B | ~A,
+right associative). Chains of one operator build a single n-ary node,
+and (&P) or (|P) a unary one, so that parse(repr(P)) == P. True and
+False are the constant atoms; any other word is the name of an atom."""
+import re
+import sys
+
+from proposition import Prop
+
+try:
+    _intern = intern
+except NameError:
+    _intern = sys.intern
+
+_token = re.compile(r'\s*(?:([A-Za-z0-9_.]+)|(.))')
+
+def tokenize(text, token=_token):
+    """Returns the list of the tokens of text: names and operators."""
+    tokens = []
+    for m in token.finditer(text):
+        name, op = m.groups()
+        if name is not None:
+            tokens.append(name)
+        elif op is not None:
+            if op not in '~-&|>()':
+                raise NameError("Unexpected character %r at %d in: %s" %
+                                (op, m.start(2), text))
+            tokens.append(op)
+    return tokens
+
+class Parser(object):
+    """Parses propositions, sharing the atoms of the names it has seen."""
+    token = _token
+
+    def __init__(self):
+        self.atoms = {'True': Prop(True), 'False': Prop(False)}
+
+    def atom(self, name):
+        P = self.atoms.get(name)
+        if P is None:
+            P = self.atoms[name] = Prop(_intern(name))
+        return P
+
+    def parse(self, text):
+        self.tokens = tokenize(text, self.token)
+        self.pos = 0
+        self.text = text
+        if not self.tokens:
+            raise NameError("Empty proposition.")
+        P = self.implication()
+        if self.pos != len(self.tokens):
+            self.error("end of input")
+        return P
+
+    def error(self, expected):
+        found = self.tokens[self.pos] if self.pos < len(self.tokens) else 'end of input'
+        raise NameError("Expected %s, found %s (token %d) in: %s" %
+                        (expected, found, self.pos, self.text))
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return None
+
+    def implication(self):
+        left = self.disjunction()
+        if self.peek() == '>':
+            self.pos += 1
+            return Prop('|', self.implication(), Prop('~', left))
+        return left
+
+    def nary(self, oper, operand):
+        terms = [operand()]
+        while self.peek() == oper:
+            self.pos += 1
+            terms.append(operand())
+        if len(terms) == 1:
+            return terms[0]
+        return Prop(oper, *terms)
+
+    def disjunction(self):
+        return self.nary('|', self.conjunction)
+
+    def conjunction(self):
+        return self.nary('&', self.difference)
+
+    def difference(self):
+        left = self.negation()
+        while self.peek() == '-':
+            self.pos += 1
+            left = Prop('&', left, Prop('~', self.negation()))
+        return left
+
+    def negation(self):
+        if self.peek() == '~':
+            self.pos += 1
+            return Prop('~', self.negation())
+        return self.primary()
+
+    def primary(self):
+        token = self.peek()
+        if token is None or token in '~-&|>)':
+            self.error("a name or (")
+        self.pos += 1
+        if token != '(':
+            return self.atom(token)
+
+        oper = None
+        if self.peek() in ['&', '|']:
+            # unary operation, printed as (&P)
+            oper = self.peek()
+            self.pos += 1
+        P = self.implication()
+        if self.peek() != ')':
+            self.error(")")
+        self.pos += 1
+        if oper is not None:
+            return Prop(oper, P)
+        return P
+
+def parse(text):
+    return Parser().parse(text)
+
+def parse_lines(lines):
+    """Generator of the propositions of lines, one per non-blank line,
+    skipping lines starting with #. Atoms are shared across lines."""
+    parser = Parser()
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield parser.parse(line)
+
+def parse_file(path):
+    """Generator of the propositions of a file, one per line."""
+    with open(path) as f:
+        for P in parse_lines(f):
+            yield P
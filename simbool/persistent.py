@@ -0,0 +1,205 @@
+"""Persistent cache of the results of simplify, in a SQLite file.
+
+    >> cache = PersistentCache('simplify.db')
+    >> simplify(P, cache=cache)    # computed, and stored
+    >> simplify(P, cache=cache)    # read back, in this or another process
+
+Propositions are keyed by a digest of their canonical form, which does
+not depend on the order of the terms of the operations nor on the
+process, and by the depth of the search. Results are stored as a table
+of their distinct subterms (see dumps). Several processes can read and
+write the same file: SQLite locks it, and its write-ahead log lets the
+readers go on while one process writes. Each process (each worker of a
+pool included) opens its own connection. With up_to_renaming (the
+default), the propositions are first put in their normal form up to the
+renaming of the variables (see canonical.py), so that a result is reused
+for every renaming of its input.
+
+The file records the version of the rewriting rules it was filled
+with (simplify.RULES_VERSION by default); it is emptied when opened
+with another version. Beyond maxsize entries, the least recently used
+ones are evicted."""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from proposition import Prop
+from memo import postorder
+from canonical import canonical_form, rename
+
+DEFAULT_MAXSIZE = 100000
+
+def _native(name):
+    """json gives back unicode strings on Python 2: turn the ASCII ones
+    back into str."""
+    if name.__class__ is not str and isinstance(name, type(u'')):
+        try:
+            return str(name)
+        except UnicodeEncodeError:
+            pass
+    return name
+
+def _encode(name):
+    try:
+        return json.dumps(name, sort_keys=True)
+    except TypeError:
+        raise NameError("Cannot serialize the name of the atom: "+repr(name))
+
+def canonical_key(P):
+    """Hex digest of the canonical form of P: each node is hashed from its
+    operator and the sorted digests of its terms."""
+    def step(task):
+        P = task[0]
+        if P.atomic:
+            return None, hashlib.sha256(b'a' + _encode(P.name).encode('utf-8')).digest()
+        op = P.get_op().encode('ascii')
+        def combine(digests):
+            return hashlib.sha256(op + b''.join(sorted(digests))).digest()
+        return [(x,) for x in P.get_terms()], combine
+    digest = postorder((P,), step)
+    return hashlib.sha256(digest).hexdigest()
+
+def dumps(P):
+    """JSON table of the distinct subterms of P, each after its terms: an
+    atom is [name], and an operation [operator, index of a term, ...]. P
+    is the last one."""
+    nodes = []
+    def step(task):
+        P = task[0]
+        if P.atomic:
+            _encode(P.name)
+            nodes.append([P.name])
+            return None, len(nodes) - 1
+        op = P.get_op()
+        def combine(indices):
+            nodes.append([op] + indices)
+            return len(nodes) - 1
+        return [(x,) for x in P.get_terms()], combine
+    postorder((P,), step)
+    return json.dumps(nodes, separators=(',', ':'))
+
+def loads(s):
+    """The Prop of a table written by dumps."""
+    props = []
+    for node in json.loads(s):
+        if len(node) == 1:
+            props.append(Prop(_native(node[0])))
+        else:
+            props.append(Prop(_native(node[0]), *[props[i] for i in node[1:]]))
+    return props[-1]
+
+class PersistentCache(object):
+    def __init__(self, path, maxsize=DEFAULT_MAXSIZE, version=None, timeout=30.0,
+                 up_to_renaming=True):
+        if version is None:
+            from simplify import RULES_VERSION
+            version = RULES_VERSION
+        self.path = path
+        self.maxsize = maxsize
+        self.version = str(version)
+        self.timeout = timeout
+        self.up_to_renaming = up_to_renaming
+        self._connection = None
+        self._pid = None
+        self._connect()
+
+    def _connect(self):
+        """The connection of the current process, opened on first use."""
+        if self._connection is not None and self._pid == os.getpid():
+            return self._connection
+        # a connection inherited through fork must not be used
+        self._connection = db = sqlite3.connect(self.path, timeout=self.timeout,
+                                                isolation_level=None)
+        self._pid = os.getpid()
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, '
+                   'value TEXT NOT NULL, used REAL NOT NULL)')
+        db.execute('CREATE INDEX IF NOT EXISTS results_used ON results (used)')
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is None or row[0] != self.version:
+                db.execute('DELETE FROM results')
+                db.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self.version,))
+                db.execute("DELETE FROM meta WHERE key = 'count'")
+            # the number of entries, kept up to date by put, so that it
+            # is not counted on every put
+            if self._count(db) is None:
+                count = db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+                db.execute("INSERT INTO meta VALUES ('count', ?)", (str(count),))
+            db.execute('COMMIT')
+        except:
+            db.execute('ROLLBACK')
+            raise
+        return db
+
+    def _count(self, db):
+        row = db.execute("SELECT value FROM meta WHERE key = 'count'").fetchone()
+        return int(row[0]) if row is not None else None
+
+    def _key(self, P, depth):
+        """Returns (key, renaming): the key of P at this depth, and the
+        renaming from the names of the stored propositions to those of P
+        (None when they are the same)."""
+        if not self.up_to_renaming:
+            return '%s:%d' % (canonical_key(P), depth), None
+        C, renaming = canonical_form(P)
+        return '%s:%d:r' % (canonical_key(C), depth), renaming
+
+    def get(self, P, depth=2):
+        """The result stored for P at this depth, or None."""
+        db = self._connect()
+        key, renaming = self._key(P, depth)
+        row = db.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        db.execute('UPDATE results SET used = ? WHERE key = ?', (time.time(), key))
+        res = loads(row[0])
+        return res if renaming is None else rename(res, renaming)
+
+    def put(self, P, res, depth=2):
+        """Stores res as the result for P at this depth, evicting the least
+        recently used entries beyond maxsize."""
+        db = self._connect()
+        key, renaming = self._key(P, depth)
+        if renaming is not None:
+            res = rename(res, dict((v, k) for k, v in renaming.items()))
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            count = self._count(db)
+            if db.execute('SELECT 1 FROM results WHERE key = ?', (key,)).fetchone() is None:
+                count += 1
+            db.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?)',
+                       (key, dumps(res), time.time()))
+            if self.maxsize is not None and count > self.maxsize:
+                # through the index on used, only the evicted rows are read
+                db.execute('DELETE FROM results WHERE key IN (SELECT key FROM results '
+                           'ORDER BY used LIMIT ?)', (count - self.maxsize,))
+                count = self.maxsize
+            db.execute("UPDATE meta SET value = ? WHERE key = 'count'", (str(count),))
+            db.execute('COMMIT')
+        except:
+            db.execute('ROLLBACK')
+            raise
+
+    def __len__(self):
+        return self._count(self._connect())
+
+    def clear(self):
+        db = self._connect()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('DELETE FROM results')
+            db.execute("UPDATE meta SET value = '0' WHERE key = 'count'")
+            db.execute('COMMIT')
+        except:
+            db.execute('ROLLBACK')
+            raise
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
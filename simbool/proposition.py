@@ -1,6 +1,105 @@
 from __future__ import print_function
+from array import array
+import sys
+import weakref
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+# Unique table for hash-consed propositions: maps (oper, terms) -- or
+# (None, name) for atoms -- to the single live node with that structure.
+_unique_table = weakref.WeakValueDictionary()
+
+# whether Prop(...) returns hash-consed nodes
+_interning = False
+
+def set_interning(enabled):
+    """Make Prop(...) return hash-consed nodes (see intern_prop).
+    Returns the previous setting."""
+    global _interning
+    previous = _interning
+    _interning = bool(enabled)
+    return previous
+
+def intern_prop(*args):
+    """Interning constructor. Takes the same arguments as Prop(...), but
+    returns the unique live node with that structure, so that structurally
+    equal interned propositions are the same object and compare by identity.
+    Subterms are interned as well."""
+    if len(args) == 0:
+        raise NameError("Malformed proposition.")
+    if len(args) == 1:
+        key = (None, args[0])
+    else:
+        key = (args[0], frozenset([intern_tree(x) for x in args[1:]]))
+
+    node = _unique_table.get(key)
+    if node is not None:
+        return node
+
+    node = object.__new__(_InternedProp)
+    if len(args) == 1:
+        Prop.__init__(node, args[0])
+    else:
+        Prop.__init__(node, args[0], *key[1])
+        node.terms = key[1]
+    _unique_table[key] = node
+    return node
+
+def intern_tree(P):
+    """Returns the interned counterpart of P (P itself if already interned)."""
+    if P._interned:
+        return P
+    if P.atomic:
+        return intern_prop(P.name)
+    return intern_prop(P.oper, *P.terms)
+
+# Propositions at most that deep are compared by the (recursive) equality
+# of their sets of terms, deeper ones by _deep_eq.
+_SHALLOW = 100
+
+def _deep_eq(P, Q):
+    """P == Q, comparing the pairs of terms from a stack instead of
+    recursively."""
+    pairs = [(P, Q)]
+    while pairs:
+        P, Q = pairs.pop()
+        if P is Q:
+            continue
+        if P._interned and Q._interned:
+            return False
+        if P.atomic or Q.atomic or P.oper != Q.oper or P.depth() <= _SHALLOW:
+            if P != Q:
+                return False
+            continue
+        if len(P.terms) != len(Q.terms) or hash(P) != hash(Q):
+            return False
+        # match the terms by hash (cached since their construction)
+        by_hash = {}
+        for y in Q.terms:
+            by_hash.setdefault(hash(y), []).append(y)
+        for x in P.terms:
+            ys = by_hash.get(hash(x))
+            if ys is None:
+                return False
+            if len(ys) == 1:
+                pairs.append((x, ys[0]))
+            elif x not in Q.terms:
+                return False
+    return True
+
+class Prop(object):
+    __slots__ = ('name', 'atomic', 'oper', 'terms',
+                 '_hash', '_size', '_depth', '_normal', '__weakref__')
+    _interned = False
+
+    def __new__(cls, *args):
+        if _interning and cls is Prop:
+            return intern_prop(*args)
+        return object.__new__(cls)
 
-class Prop:
     def __init__(self, *args):
         """Proposition constructor.
         Prop(True), Prop(False) constructs the True and False atoms.
@@ -14,19 +113,27 @@ class Prop:
             redundance-elimination-intersection: Prop1 & Prop2 -> (&Prop1) if Prop1 == Prop2"""
         if len(args) == 0:
             raise NameError("Malformed proposition.")
-        
+
         if len(args) == 1:
             self.name = args[0]
+            self.oper = None
+            self.terms = None
             self.atomic = True
-
-        if len(args) > 1:
+        else:
             if args[0] not in ['&', '|', '~'] or \
                 args[0] == '~' and len(args)>2:
                 raise NameError("Malformed proposition: "+str(args)) 
+            self.name = None
             self.oper = args[0]
             self.terms = frozenset(args[1:])
             self.atomic = False
 
+        self._hash = None
+        self._size = None
+        self._depth = None
+        # bit set of the simplification passes this node is a fixed point of
+        self._normal = 0
+
     def is_atomic(self):
         return self.atomic
     
@@ -42,22 +149,32 @@ class Prop:
     
     def __eq__(self, other):
         """Syntactic equality testing. Fully commutative but not associative. 
-        If True, then the two propositions are equal. If False, unsure."""
+        If True, then the two propositions are equal. If False, unsure.
+        Two interned propositions are equal iff they are the same object."""
+        if self is other:
+            return True
+        if self._interned and other._interned:
+            return False
         if self.atomic:
             if other.atomic:
                 return self.name == other.name
             return False
         if other.atomic:
             return False
-        if self.oper == self.oper:
-            return self.terms == other.terms
+        if self.oper == other.oper:
+            depth = self._depth
+            if depth is None:
+                depth = self.depth()
+            if depth <= _SHALLOW:
+                return self.terms == other.terms
+            return _deep_eq(self, other)
         return False
     
     def __ne__(self, other):
         return not (self == other)
     
     def __hash__(self):
-        if '_hash' in self.__dict__:
+        if self._hash is not None:
             return self._hash
         if self.atomic:
             self._hash = hash(self.name)
@@ -65,33 +182,50 @@ class Prop:
         self._hash = hash(hash(self.oper)^hash(self.terms))
         return self._hash
     
+    def __reduce__(self):
+        # the node table of to_bytes, so that pickling is not recursive.
+        # Every Prop pickles into a table of its own, which the memo of
+        # pickle cannot share with others: use to_bytes(*props) to store
+        # several propositions with their common subterms once.
+        return (from_bytes, (to_bytes(self),))
+
     def __repr__(self):
         def no_parenthesing(s):
             return s.atomic or s.oper == '~'
         
-        if self.atomic:
-            return str(self.name)
-        
-        oper = self.oper
-        if oper == '~':
-            a = [x for x in self.terms][0]
-            if no_parenthesing(a):
-                return oper+repr(a)
-            return oper+'('+repr(a)+')'
-        
-        if oper in ['&', '|']:
-            subs = []
-            for e in self.terms:
+        # written in pre-order from a stack of strings and propositions
+        pieces = []
+        stack = [self]
+        while stack:
+            P = stack.pop()
+            if P.__class__ is str:
+                pieces.append(P)
+                continue
+            if P.atomic:
+                pieces.append(str(P.name))
+                continue
+
+            oper = P.oper
+            items = []
+            if oper == '~':
+                items.append(oper)
+            elif oper in ['&', '|']:
+                assert(len(P.terms) > 0)
+                if len(P.terms) == 1:
+                    items.append('('+oper)
+            else:
+                assert(False)
+            for i, e in enumerate(P.terms):
+                if i > 0:
+                    items.append(' '+oper+' ')
                 if no_parenthesing(e):
-                    subs.append(repr(e))
+                    items.append(e)
                 else:
-                    subs.append('('+repr(e)+')')
-            assert(len(subs) > 0)
-            if len(subs) == 1:
-                return '('+oper+subs[0]+')'
-            return (' '+oper+' ').join(subs)
-        
-        assert(False)
+                    items += ['(', e, ')']
+            if oper != '~' and len(P.terms) == 1:
+                items.append(')')
+            stack.extend(reversed(items))
+        return ''.join(pieces)
 
     def __and__(self, other):
         return Prop('&', self, other)
@@ -119,92 +253,252 @@ class Prop:
         return other.__sub__(self)
     
     def __pformat(self, indentation=0, space=' '):
-        if self.is_literal():
-            if self.is_positive():
-                return str(self.name)
-            return '~'+str(self.get_terms()[0].name)
-        
-        oper = self.oper
-        if oper == '~':
-            a = [x for x in self.terms][0]
-            return oper+' '+a.__pformat(indentation+2)
-        
-        if oper in ['&', '|']:
-            subs = []
-            for e in self.terms:
-                subs.append(e.__pformat(indentation+2))
-            return oper+' '+('\n'+space*(indentation+2)).join(subs)
-        
-        assert(False)
+        pieces = []
+        stack = [(self, indentation)]
+        while stack:
+            item = stack.pop()
+            if item.__class__ is str:
+                pieces.append(item)
+                continue
+            P, indentation = item
+            if P.is_literal():
+                if P.is_positive():
+                    pieces.append(str(P.name))
+                else:
+                    pieces.append('~'+str(P.get_terms()[0].name))
+                continue
+
+            oper = P.oper
+            if oper not in ['~', '&', '|']:
+                assert(False)
+            pieces.append(oper+' ')
+            items = []
+            for e in P.terms:
+                if items:
+                    items.append('\n'+space*(indentation+2))
+                items.append((e, indentation+2))
+            stack.extend(reversed(items))
+        return ''.join(pieces)
 
     def __str__(self):
         return self.__pformat()
 
+    def compile(self, variables=None):
+        """Compiled evaluator of the proposition over batches of
+        assignments (see evaluate.Evaluator)."""
+        import evaluate
+        return evaluate.compile_prop(self, variables)
+
+    def evaluate(self, assignment):
+        """Value of the proposition under assignment, a dict mapping the
+        name of every variable to a boolean."""
+        import evaluate
+        return evaluate.evaluate(self, assignment)
+
     def get_op(self):
-        return self.__dict__.get('oper', None)
+        return self.oper
 
     def get_terms(self):
-        return [x for x in self.__dict__.get('terms', [None])]
+        if self.terms is None:
+            return [None]
+        return [x for x in self.terms]
 
     def size(self):
-        if '_size' in self.__dict__:
-            return self._size
-        if self.atomic:
-            self._size = 1
-            return 1
-        self._size = 1 + sum([x.size() for x in self.terms])
+        if self._size is None:
+            stack = [self]
+            while stack:
+                P = stack[-1]
+                if P._size is not None:
+                    stack.pop()
+                elif P.atomic:
+                    P._size = 1
+                    stack.pop()
+                else:
+                    missing = [x for x in P.terms if x._size is None]
+                    if missing:
+                        stack += missing
+                    else:
+                        P._size = 1 + sum([x._size for x in P.terms])
+                        stack.pop()
         return self._size
     
     def depth(self):
-        if '_depth' in self.__dict__:
-            return self._depth
-        if self.is_literal():
-            self._depth = 1
-            return 1
-        self._depth = 1 + max([x.depth() for x in self.terms])
+        if self._depth is None:
+            stack = [self]
+            while stack:
+                P = stack[-1]
+                if P._depth is not None:
+                    stack.pop()
+                elif P.is_literal():
+                    P._depth = 1
+                    stack.pop()
+                else:
+                    missing = [x for x in P.terms if x._depth is None]
+                    if missing:
+                        stack += missing
+                    else:
+                        P._depth = 1 + max([x._depth for x in P.terms])
+                        stack.pop()
         return self._depth
 
     def var_stats(self):
-        #if '_var_stats' in self.__dict__:
-        #    return self._var_stats
-
+        """Maps every atom to its number of [positive, negative]
+        occurrences, negations counting through the operations below them."""
         counts = dict()
-        #self._var_stats = counts
 
-        if self.is_literal():
-            if self.is_positive():
-                if self not in counts:
-                    counts[self] = [0, 0]
-                counts[self][0] += 1
-            else:
-                pos = self.get_terms()[0]
+        # occurrences, with 0 if positive and 1 if under a negation
+        stack = [(self, 0)]
+        while stack:
+            P, sign = stack.pop()
+            if P.is_literal():
+                if P.is_positive():
+                    pos = P
+                else:
+                    pos = P.get_terms()[0]
+                    sign = 1 - sign
                 if pos not in counts:
                     counts[pos] = [0, 0]
-                counts[pos][1] += 1
-            return counts
-        
-        if self.oper == '~':
-            for sub in self.terms:
-                nc = sub.var_stats()
-                for e in nc:
-                    if e not in counts:
-                        counts[e] = [0, 0]
-                    counts[e][0] += nc[e][1]
-                    counts[e][1] += nc[e][0]
-            return counts
-        
-        def update(a, counts):
-            for e in a:
-                if e not in counts:
-                    counts[e] = a[e]
-                else:
-                    counts[e][0] += a[e][0]
-                    counts[e][1] += a[e][1]
+                counts[pos][sign] += 1
+            elif P.oper == '~':
+                stack += [(sub, 1 - sign) for sub in P.terms]
+            elif P.oper in ['&', '|']:
+                stack += [(sub, sign) for sub in P.terms]
+            else:
+                raise NameError("ERROR")
+        return counts
+
+# Binary format of to_bytes: the magic 'SB', the byte order ('<' or '>'),
+# a flags byte (1 if the nodes are interned), then the int32 counts of
+# nodes, of children, of bytes of the names and of roots, the int32
+# arrays of the offsets, of the children and of the roots, the byte array
+# of the opcodes, and the pickled list of the names.
+_MAGIC = b'SB'
+_ORDER = b'<' if sys.byteorder == 'little' else b'>'
+_OPCODES = {'~': 1, '&': 2, '|': 3}
+_OPERS = {1: '~', 2: '&', 3: '|'}
+
+def _tobytes(a):
+    if hasattr(a, 'tobytes'):
+        return a.tobytes()
+    return a.tostring()
 
-        if self.oper in ['&', '|']:
-            for sub in self.terms:
-                update(sub.var_stats(), counts)
-            return counts
+def to_bytes(*props):
+    """Serializes the propositions as one table of their distinct
+    subterms, each after its terms, with the names of the atoms stored
+    once: the children of node i are children[offsets[i]:offsets[i+1]],
+    node indices for operations and the index of the name for atoms.
+    The subterms shared by several of the propositions are stored once
+    as well, and read back as the same objects by from_bytes_all."""
+    from memo import postorder, _LocalCache
+    names = []
+    name_index = {}
+    ops = array('b')
+    offsets = array('i', [0])
+    children = array('i')
+    def add(op, kids):
+        ops.append(op)
+        children.extend(kids)
+        offsets.append(len(children))
+        return len(ops) - 1
+    def step(task):
+        Q = task[0]
+        if Q.atomic:
+            # True and 1 are equal, but are different names
+            key = (Q.name.__class__, Q.name)
+            index = name_index.get(key)
+            if index is None:
+                index = name_index[key] = len(names)
+                names.append(Q.name)
+            return None, add(0, [index])
+        op = _OPCODES[Q.oper]
+        return [(x,) for x in Q.terms], lambda kids: add(op, kids)
+    # one cache for all the propositions, so that they share their nodes
+    cache = _LocalCache()
+    roots = array('i', [postorder((P,), step, cache) for P in props])
+    names = pickle.dumps(names, 2)
+    header = array('i', [len(ops), len(children), len(names), len(roots)])
+    interned = len(props) > 0 and all(P._interned for P in props)
+    return b''.join([_MAGIC, _ORDER, b'\x01' if interned else b'\x00',
+                     _tobytes(header), _tobytes(offsets), _tobytes(children),
+                     _tobytes(roots), _tobytes(ops), names])
 
-        raise NameError("ERROR")
+def _ints(view, start, count, code='i'):
+    """The count integers of the array code at start in the memoryview,
+    without copy if the memoryview can be cast (Python 3)."""
+    end = start + count*array(code).itemsize
+    if hasattr(view, 'cast'):
+        return view[start:end].cast(code)
+    return array(code, view[start:end].tobytes())
+
+def from_bytes_all(data):
+    """The list of the Props of data written by to_bytes (bytes,
+    bytearray or a memoryview over them), in the order they were given.
+    Raises NameError if data is not a valid table."""
+    view = memoryview(data)
+    if view[:2].tobytes() != _MAGIC:
+        raise NameError("Not a serialized proposition.")
+    if view[2:3].tobytes() != _ORDER:
+        raise NameError("Proposition serialized with another byte order.")
+    build = intern_prop if view[3:4].tobytes() == b'\x01' else Prop
+    size = array('i').itemsize
+    start = 4 + 4*size
+    if len(view) < start:
+        raise NameError("Truncated serialized proposition.")
+    n, m, length, k = _ints(view, 4, 4)
+    if min(n, m, length, k) < 0 or \
+       start + (n + 1 + m + k)*size + n + length != len(view):
+        raise NameError("Truncated serialized proposition.")
+    offsets = _ints(view, start, n + 1)
+    start += (n + 1)*size
+    children = _ints(view, start, m)
+    start += m*size
+    roots = _ints(view, start, k)
+    start += k*size
+    ops = _ints(view, start, n, 'b')
+    start += n
+    try:
+        names = pickle.loads(view[start:].tobytes())
+    except Exception:
+        raise NameError("Corrupt names in serialized proposition.")
+    if not isinstance(names, list) or offsets[0] != 0 or offsets[n] != m:
+        raise NameError("Corrupt serialized proposition.")
+
+    props = []
+    for i in range(n):
+        op = ops[i]
+        first, last = offsets[i], offsets[i+1]
+        if not first <= last <= m:
+            raise NameError("Corrupt offsets of node %d." % i)
+        kids = children[first:last]
+        if op == 0:
+            if len(kids) != 1 or not 0 <= kids[0] < len(names):
+                raise NameError("Corrupt atom at node %d." % i)
+            props.append(build(names[kids[0]]))
+            continue
+        # the terms of a node come before it
+        if op not in _OPERS or not kids or (op == 1 and len(kids) != 1) or \
+           not all(0 <= j < i for j in kids):
+            raise NameError("Corrupt operation at node %d." % i)
+        props.append(build(_OPERS[op], *[props[j] for j in kids]))
+    if not all(0 <= r < n for r in roots):
+        raise NameError("Corrupt roots of serialized propositions.")
+    return [props[r] for r in roots]
+
+def from_bytes(data):
+    """The Prop of data written by to_bytes(P) (bytes, bytearray or a
+    memoryview over them). Raises NameError if data is not a valid table
+    of one proposition."""
+    props = from_bytes_all(data)
+    if len(props) != 1:
+        raise NameError("Serialized table of %d propositions." % len(props))
+    return props[0]
+
+class _InternedProp(Prop):
+    """Nodes of the unique table. They are fully built by intern_prop, so
+    the constructor call that follows __new__ must not touch them."""
+    __slots__ = ()
+    _interned = True
+
+    def __init__(self, *args):
+        pass
 
@@ -0,0 +1,381 @@
+"""Satisfiability of propositions with a small CDCL solver.
+
+Propositions of any size are turned into clauses by the Tseitin
+encoding (one variable per distinct subterm), and solved by conflict
+driven clause learning: two watched literals per clause, first-UIP
+learning with non-chronological backtracking, activity-based decisions
+with saved phases, and restarts on the Luby sequence.
+
+    >> is_satisfiable(A & ~A)
+    False
+    >> is_tautology(A | ~A)
+    True
+    >> constant_value((A | B) & (A | ~B) & ~A)
+    False
+
+The Solver class can be used directly on DIMACS-style clauses: variables
+are numbered from 1, and literals are the variables or their negation.
+The search can be bounded by a number of conflicts, and then gives None
+when it cannot conclude."""
+import heapq
+
+from proposition import Prop
+from memo import postorder
+
+# conflicts between two restarts, times the Luby sequence
+RESTART_BASE = 100
+
+def _luby(i):
+    """The i-th term (from 1) of the Luby sequence 1 1 2 1 1 2 4..."""
+    k = 1
+    while (1 << k) - 1 < i:
+        k += 1
+    while (1 << k) - 1 != i:
+        i -= (1 << (k - 1)) - 1
+        k = 1
+        while (1 << k) - 1 < i:
+            k += 1
+    return 1 << (k - 1)
+
+class Solver(object):
+    # literal codes: 2*v for v, 2*v + 1 for -v, so that the negation of a
+    # code is code ^ 1; values of codes: 1 true, 0 false, -1 unassigned
+
+    def __init__(self):
+        self.nvars = 0
+        self.ok = True
+        self.values = [-1, -1]
+        self.level = [0]
+        self.reason = [None]
+        self.activity = [0.0]
+        self.phase = [1]
+        self.watches = [[], []]
+        self.trail = []
+        self.trail_lim = []
+        self.qhead = 0
+        self.heap = []
+        self.increment = 1.0
+        self.conflicts = 0
+        self.model = None
+
+    def new_var(self):
+        self.nvars += 1
+        v = self.nvars
+        self.values += [-1, -1]
+        self.level.append(0)
+        self.reason.append(None)
+        self.activity.append(0.0)
+        self.phase.append(1)
+        self.watches += [[], []]
+        heapq.heappush(self.heap, (0.0, v))
+        return v
+
+    def add_clause(self, literals):
+        """Adds the clause of literals (non-zero integers, -v for the
+        negation of the variable v). Returns False if the clauses are
+        found unsatisfiable."""
+        if not self.ok:
+            return False
+        self._cancel(0)
+        values = self.values
+        clause = []
+        for l in set(literals):
+            code = 2*l if l > 0 else -2*l + 1
+            if code >> 1 > self.nvars or l == 0:
+                raise NameError("Unknown variable in clause: "+str(l))
+            if values[code] == 1 or code ^ 1 in clause:
+                return True
+            if values[code] == -1:
+                clause.append(code)
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self._enqueue(clause[0], None)
+            self.ok = self._propagate() is None
+        else:
+            self.watches[clause[0]].append(clause)
+            self.watches[clause[1]].append(clause)
+        return self.ok
+
+    def _enqueue(self, code, reason):
+        v = code >> 1
+        self.values[code] = 1
+        self.values[code ^ 1] = 0
+        self.level[v] = len(self.trail_lim)
+        self.reason[v] = reason
+        self.trail.append(code)
+
+    def _cancel(self, level):
+        if len(self.trail_lim) <= level:
+            return
+        values, phase, activity, heap = self.values, self.phase, self.activity, self.heap
+        start = self.trail_lim[level]
+        for code in self.trail[start:]:
+            v = code >> 1
+            values[code] = values[code ^ 1] = -1
+            self.reason[v] = None
+            phase[v] = code & 1
+            heapq.heappush(heap, (-activity[v], v))
+        del self.trail[start:]
+        del self.trail_lim[level:]
+        self.qhead = start
+
+    def _propagate(self):
+        """Propagates the assignments of the trail, and returns a clause
+        made false, or None."""
+        values, watches, trail = self.values, self.watches, self.trail
+        while self.qhead < len(trail):
+            false_code = trail[self.qhead] ^ 1
+            self.qhead += 1
+            ws = watches[false_code]
+            i = j = 0
+            n = len(ws)
+            while i < n:
+                c = ws[i]
+                i += 1
+                if c[0] == false_code:
+                    c[0], c[1] = c[1], false_code
+                first = c[0]
+                if values[first] == 1:
+                    ws[j] = c
+                    j += 1
+                    continue
+                for k in range(2, len(c)):
+                    if values[c[k]] != 0:
+                        c[1], c[k] = c[k], false_code
+                        watches[c[1]].append(c)
+                        break
+                else:
+                    ws[j] = c
+                    j += 1
+                    if values[first] == 0:
+                        while i < n:
+                            ws[j] = ws[i]
+                            j += 1
+                            i += 1
+                        del ws[j:]
+                        self.qhead = len(trail)
+                        return c
+                    self._enqueue(first, c)
+            del ws[j:]
+        return None
+
+    def _bump(self, v):
+        activity = self.activity
+        activity[v] += self.increment
+        if activity[v] > 1e100:
+            for u in range(1, self.nvars + 1):
+                activity[u] *= 1e-100
+            self.increment *= 1e-100
+            self.heap = [(-activity[u], u) for u in range(1, self.nvars + 1)
+                         if self.values[2*u] == -1]
+            heapq.heapify(self.heap)
+        elif self.values[2*v] == -1:
+            heapq.heappush(self.heap, (-activity[v], v))
+
+    def _analyze(self, conflict):
+        """Returns (learnt clause, backtrack level) for the conflict, by
+        resolution up to the first unique implication point. The asserting
+        literal comes first, and one of the highest level next."""
+        level, reason, trail = self.level, self.reason, self.trail
+        current = len(self.trail_lim)
+        seen = set()
+        learnt = [None]
+        pending = 0
+        code = None
+        c = conflict
+        index = len(trail) - 1
+        while True:
+            for q in (c if code is None else c[1:]):
+                v = q >> 1
+                if v not in seen and level[v] > 0:
+                    seen.add(v)
+                    self._bump(v)
+                    if level[v] >= current:
+                        pending += 1
+                    else:
+                        learnt.append(q)
+            while trail[index] >> 1 not in seen:
+                index -= 1
+            code = trail[index]
+            index -= 1
+            c = reason[code >> 1]
+            seen.discard(code >> 1)
+            pending -= 1
+            if pending == 0:
+                break
+        learnt[0] = code ^ 1
+        if len(learnt) == 1:
+            return learnt, 0
+        k = max(range(1, len(learnt)), key=lambda k: level[learnt[k] >> 1])
+        learnt[1], learnt[k] = learnt[k], learnt[1]
+        return learnt, level[learnt[1] >> 1]
+
+    def _decide(self):
+        """An unassigned variable of maximal activity, or None."""
+        heap, values, activity = self.heap, self.values, self.activity
+        while heap:
+            a, v = heapq.heappop(heap)
+            if values[2*v] == -1 and -a == activity[v]:
+                return v
+        for v in range(1, self.nvars + 1):
+            if values[2*v] == -1:
+                return v
+        return None
+
+    def solve(self, assumptions=(), max_conflicts=None):
+        """Returns True if the clauses are satisfiable with the literals of
+        assumptions true (then self.model maps every variable to its
+        value), False if not, and None if max_conflicts conflicts are
+        reached first."""
+        self.model = None
+        if not self.ok:
+            return False
+        self._cancel(0)
+        if self._propagate() is not None:
+            self.ok = False
+            return False
+        assumptions = [2*l if l > 0 else -2*l + 1 for l in assumptions]
+        values = self.values
+        conflicts = 0
+        restarts = 1
+        limit = RESTART_BASE*_luby(restarts)
+        since_restart = 0
+        while True:
+            conflict = self._propagate()
+            if conflict is not None:
+                conflicts += 1
+                since_restart += 1
+                self.conflicts += 1
+                if not self.trail_lim:
+                    self.ok = False
+                    return False
+                learnt, back = self._analyze(conflict)
+                self._cancel(back)
+                if len(learnt) == 1:
+                    self._enqueue(learnt[0], None)
+                else:
+                    self.watches[learnt[0]].append(learnt)
+                    self.watches[learnt[1]].append(learnt)
+                    self._enqueue(learnt[0], learnt)
+                self.increment /= 0.95
+                continue
+            if max_conflicts is not None and conflicts >= max_conflicts:
+                self._cancel(0)
+                return None
+            if since_restart >= limit:
+                restarts += 1
+                limit = RESTART_BASE*_luby(restarts)
+                since_restart = 0
+                self._cancel(0)
+                continue
+            code = None
+            while len(self.trail_lim) < len(assumptions):
+                a = assumptions[len(self.trail_lim)]
+                if values[a] == 0:
+                    self._cancel(0)
+                    return False
+                self.trail_lim.append(len(self.trail))
+                if values[a] == -1:
+                    code = a
+                    break
+            if code is None:
+                v = self._decide()
+                if v is None:
+                    self.model = [None] + [values[2*u] == 1 for u in range(1, self.nvars + 1)]
+                    self._cancel(0)
+                    return True
+                code = 2*v + self.phase[v]
+                self.trail_lim.append(len(self.trail))
+            self._enqueue(code, None)
+
+class Encoder(object):
+    """Tseitin encoding of propositions into the clauses of a Solver: the
+    literal of every subterm is equivalent to it, so that the encoding of
+    a proposition answers for its negation as well."""
+
+    def __init__(self, solver=None):
+        self.solver = solver if solver is not None else Solver()
+        self.variables = {}
+        self._literals = {}
+        self._true = self.solver.new_var()
+        self.solver.add_clause([self._true])
+
+    def literal(self, P):
+        """The literal equivalent to P, adding its clauses."""
+        solver, literals = self.solver, self._literals
+        def step(task):
+            P = task[0]
+            lit = literals.get(P)
+            if lit is not None:
+                return None, lit
+            if P.atomic:
+                if P.name is True or P.name is False:
+                    return None, self._true if P.name else -self._true
+                lit = self.variables.get(P.name)
+                if lit is None:
+                    lit = self.variables[P.name] = solver.new_var()
+                literals[P] = lit
+                return None, lit
+            op = P.get_op()
+            def combine(kids):
+                if op == '~':
+                    lit = -kids[0]
+                else:
+                    lit = solver.new_var()
+                    sign = 1 if op == '&' else -1
+                    for k in kids:
+                        solver.add_clause([-sign*lit, sign*k])
+                    solver.add_clause([sign*lit] + [-sign*k for k in kids])
+                literals[P] = lit
+                return lit
+            return [(x,) for x in P.get_terms()], combine
+        return postorder((P,), step)
+
+    def assignment(self):
+        """The values of the atoms in the model of the last satisfiable
+        call of the solver."""
+        model = self.solver.model
+        return dict((name, model[v]) for name, v in self.variables.items())
+
+def is_satisfiable(P, max_conflicts=None):
+    """True or False, or None if max_conflicts conflicts are reached."""
+    encoder = Encoder()
+    return encoder.solver.solve([encoder.literal(P)], max_conflicts)
+
+def satisfying_assignment(P):
+    """A dict mapping the name of every variable of P to a boolean, under
+    which P is true, or None if there is none."""
+    encoder = Encoder()
+    if not encoder.solver.solve([encoder.literal(P)]):
+        return None
+    return encoder.assignment()
+
+def is_tautology(P, max_conflicts=None):
+    res = is_satisfiable(Prop('~', P), max_conflicts)
+    return None if res is None else not res
+
+def is_contradiction(P, max_conflicts=None):
+    res = is_satisfiable(P, max_conflicts)
+    return None if res is None else not res
+
+def is_equivalent(P, Q, max_conflicts=None):
+    encoder = Encoder()
+    p, q = encoder.literal(P), encoder.literal(Q)
+    for assumptions in [[p, -q], [-p, q]]:
+        res = encoder.solver.solve(assumptions, max_conflicts)
+        if res is not False:
+            return None if res is None else False
+    return True
+
+def constant_value(P, max_conflicts=None):
+    """Prop(False) if P is unsatisfiable, Prop(True) if it is a tautology,
+    and None if it is neither or if that is not found within max_conflicts
+    conflicts for each check."""
+    encoder = Encoder()
+    lit = encoder.literal(P)
+    if encoder.solver.solve([lit], max_conflicts) is False:
+        return Prop(False)
+    if encoder.solver.solve([-lit], max_conflicts) is False:
+        return Prop(True)
+    return None
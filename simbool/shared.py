@@ -0,0 +1,150 @@
+"""Writing and reading propositions with their shared subterms named.
+
+    >> S = (A & ~B) | C
+    >> write_shared((S & D) | (S & ~D), sys.stdout)
+    @1 = C | (A & ~B)
+    (~D & @1) | (D & @1)
+    >> read_shared(open('rules.txt'))
+
+Prop.__repr__ prints a subterm every time it occurs, so the text of the
+propositions built by hypo2 or hypo3, whose subterms are shared, can be
+exponentially larger than the propositions in memory. Here every
+subterm occurring more than once (and not a literal) is written once,
+on a line of its own binding it to a name @n, and the other lines refer
+to it by that name. The same is done for subterms nested more than
+MAX_INLINE_DEPTH deep, so that the lines stay short and deep
+propositions do not exhaust the stack of the parser. Lines are written
+to the file-like object as soon as they are known, in time proportional
+to the number of distinct subterms.
+
+The other lines are written as Prop.__repr__ prints, and read by the
+parser of parse.py, with the names @n added. A SharedWriter can write
+several propositions: the names bound for one are used by the next
+ones, which is convenient for logs of rules sharing subterms."""
+import re
+
+from proposition import Prop
+from memo import postorder
+from parse import Parser
+
+try:
+    _string = basestring
+except NameError:
+    _string = str
+
+# depth of the subterms written inline, beyond which they are named
+MAX_INLINE_DEPTH = 50
+
+_name = re.compile(r'[A-Za-z0-9_.]+$')
+
+_token = re.compile(r'\s*(?:(@?[A-Za-z0-9_.]+)|(.))')
+
+_binding = re.compile(r'(@[0-9]+)\s*=')
+
+class SharedWriter(object):
+    """Writes propositions to the file-like out, one line per name bound
+    and one line per proposition."""
+
+    def __init__(self, out, max_depth=MAX_INLINE_DEPTH):
+        self.out = out
+        self.max_depth = max_depth
+        # the names bound so far
+        self.names = {}
+
+    def _bind(self, text):
+        name = '@%d' % (len(self.names) + 1)
+        self.out.write('%s = %s\n' % (name, text))
+        return name
+
+    def write(self, P):
+        names = self.names
+        # number of occurrences of every subterm not named yet
+        refs = {}
+        stack = [] if P.atomic else [P]
+        while stack:
+            Q = stack.pop()
+            for x in Q.terms:
+                if x not in names:
+                    refs[x] = refs.get(x, 0) + 1
+                    if refs[x] == 1 and not x.atomic:
+                        stack.append(x)
+
+        # (text, depth, whether it needs parentheses as a term)
+        def step(task):
+            Q = task[0]
+            name = names.get(Q)
+            if name is not None:
+                return None, (name, 0, False)
+            if Q.atomic:
+                if Q.name is not True and Q.name is not False and \
+                   not (isinstance(Q.name, str) and _name.match(Q.name)):
+                    raise NameError("Cannot write the name of the atom: "+repr(Q.name))
+                return None, (str(Q.name), 0, False)
+            oper = Q.oper
+            def combine(kids):
+                pieces = []
+                for text, depth, compound in kids:
+                    pieces.append('(' + text + ')' if compound else text)
+                if oper == '~':
+                    text = '~' + pieces[0]
+                elif len(pieces) == 1:
+                    text = '(' + oper + pieces[0] + ')'
+                else:
+                    text = (' ' + oper + ' ').join(pieces)
+                depth = 1 + max(depth for _, depth, _ in kids)
+                if Q is not P and not Q.is_literal() and \
+                   (refs.get(Q, 0) > 1 or depth > self.max_depth):
+                    name = names[Q] = self._bind(text)
+                    return name, 0, False
+                return text, depth, oper != '~' and len(pieces) > 1
+            return [(x,) for x in Q.terms], combine
+        text = postorder((P,), step)[0]
+        self.out.write(text + '\n')
+
+def write_shared(P, out, max_depth=MAX_INLINE_DEPTH):
+    """Writes P to the file-like out, its shared subterms named."""
+    SharedWriter(out, max_depth).write(P)
+
+class _SharedParser(Parser):
+    token = _token
+
+    def __init__(self):
+        Parser.__init__(self)
+        self.bindings = {}
+
+    def atom(self, name):
+        if name.startswith('@'):
+            P = self.bindings.get(name)
+            if P is None:
+                raise NameError("Unbound name %s in: %s" % (name, self.text))
+            return P
+        return Parser.atom(self, name)
+
+def parse_shared(lines):
+    """Generator of the propositions of lines written by a SharedWriter
+    (or write_shared), in order. Blank lines and lines starting with #
+    are skipped."""
+    parser = _SharedParser()
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        # lines of propositions can start with a name as well
+        m = _binding.match(line)
+        if m is not None:
+            parser.bindings[m.group(1)] = parser.parse(line[m.end():])
+        else:
+            yield parser.parse(line)
+
+def read_shared(source):
+    """The last proposition of a file (a path or a file object) written
+    by write_shared."""
+    if isinstance(source, _string):
+        with open(source) as f:
+            return read_shared(f)
+    P = None
+    for P in parse_shared(source):
+        pass
+    if P is None:
+        raise NameError("No proposition in the file.")
+    return P
@@ -1,8 +1,44 @@
+import itertools
+import time
+
 from proposition import Prop
+from memo import memoized, cache_for, postorder
+from instrument import instrumented
+import truthtable
+import sat
+import cnf
 
 __falseProp = Prop(False)
 __trueProp = Prop(True)
 
+# If not None, a case split whose rewriting reaches a fixed point more
+# than BOUND_SLACK times as large as the best candidate found so far is
+# given up before factoring (see simplify_pure). This pruning is an
+# unsafe heuristic, off by default: factoring can still shrink such a
+# fixed point by any amount, and no lower bound on the final size is
+# known, so the cutoff can drop the candidate that would have won. The
+# results stay equivalent to the input, but may be larger.
+BOUND_SLACK = None
+
+# Before rewriting, simplify looks for at most SAT_PRECHECK_CONFLICTS
+# conflicts of the SAT solver whether its argument is constant (about a
+# second in the worst case). 0 disables the check.
+SAT_PRECHECK_CONFLICTS = 1000
+
+# Version of the rewriting rules, recorded by the persistent caches of
+# results (see persistent.py): bump it whenever a change of the passes
+# may change their results.
+RULES_VERSION = 2
+
+# Prop._normal flags: the node is known to be left unchanged by the pass,
+# so that the fixed-point loops can skip it on later iterations.
+_COLLECTED = 1
+_SIMPLIFIED = 2
+_NEG_PUSHED = 4
+_PROPAGATED = 8
+_FACTORED = 16
+
+@memoized('simplify_term')
 def simplify_term(P):
     """negation-atom: ~True -> False; ~False -> True
     negation-elimination: ~~Prop -> Prop
@@ -60,6 +96,8 @@ def simplify_term(P):
         terms = list(pos)+list(negn)
         if len(terms) == 1:
             return terms[0]
+        if len(terms) == len(P.terms):
+            return P
         return Prop('&', *terms)
 
     if P.get_op() == '|':
@@ -80,6 +118,8 @@ def simplify_term(P):
         terms = list(pos)+list(negn)
         if len(terms) == 1:
             return terms[0]
+        if len(terms) == len(P.terms):
+            return P
         
         return Prop('|', *terms)
     
@@ -88,102 +128,167 @@ def simplify_term(P):
 def associative_collect(P):
     return __associative_collect(P)[0]
 
-def __associative_collect(P, sym = None):
+def __associative_collect(P, sym=None):
+    return postorder((P, sym), _collect_step, cache_for('associative_collect'))
+
+def _collect_step(task):
+    """Step of __associative_collect (see memo.postorder): the list of the
+    terms P contributes to an enclosing sym-operation."""
+    P, sym = task
     if P.is_literal():
-        return [P]
+        return None, [P]
 
     if P.get_op() == '~':
-        return [Prop('~', *__associative_collect(P.get_terms()[0]))]
-
+        sub = P.get_terms()[0]
+        def combine(results):
+            col = results[0]
+            if col[0] is sub:
+                return [P]
+            return [Prop('~', *col)]
+        return [(sub, None)], combine
+
+    terms = P.get_terms()
     if sym != P.get_op():
-        col = []
-        for e in P.get_terms():
-            col += __associative_collect(e, P.get_op())
-        return [Prop(P.get_op(), *col)]
+        if P._normal & _COLLECTED:
+            return None, [P]
+        def combine(results):
+            col = []
+            changed = False
+            for e, r in zip(terms, results):
+                if len(r) != 1 or r[0] is not e:
+                    changed = True
+                col += r
+            if not changed:
+                P._normal |= _COLLECTED
+                return [P]
+            return [Prop(P.get_op(), *col)]
+        return [(e, P.get_op()) for e in terms], combine
     else:
-        col = []
-        for e in P.get_terms():
-            r = __associative_collect(e, sym)
-            col += r
-        return col
-    
-    assert(False)
+        def combine(results):
+            col = []
+            for r in results:
+                col += r
+            return col
+        return [(e, sym) for e in terms], combine
 
 def simplify_everywhere(P):
     res = __simplify_everywhere(P)
     res_old = res
     while True:
         res = __simplify_everywhere(res)
-        if res_old == res:
+        if res is res_old:
             break
         res_old = res
     return res
 
 def __simplify_everywhere(P):
-    if P.atomic:
-        return P
+    return postorder((P,), _simplify_step, cache_for('simplify_everywhere'))
+
+def _simplify_step(task):
+    """Step of __simplify_everywhere: simplify_term at every node."""
+    P = task[0]
+    if P.atomic or P._normal & _SIMPLIFIED:
+        return None, P
     
     simplified = simplify_term(P)
 
     if simplified.atomic:
-        return simplified
+        return None, simplified
     
-    return Prop(simplified.get_op(), *[__simplify_everywhere(sub) for sub in simplified.get_terms()])
+    terms = simplified.get_terms()
+    def combine(new_terms):
+        if all(x is y for x, y in zip(new_terms, terms)):
+            if simplified is P:
+                P._normal |= _SIMPLIFIED
+            return simplified
+        return Prop(simplified.get_op(), *new_terms)
+    return [(sub,) for sub in terms], combine
 
 def push_neg(P):
+    return postorder((P,), _push_neg_step, cache_for('push_neg'))
+
+def _push_neg_step(task):
+    """Step of push_neg: negations moved down to the atoms."""
+    P = task[0]
     if P.is_literal():
-        return P
+        return None, P
 
     if P.get_op() in ['&', '|']:
-        return Prop(P.get_op(), *[push_neg(sub) for sub in P.get_terms()])
+        if P._normal & _NEG_PUSHED:
+            return None, P
+        terms = P.get_terms()
+        def combine(new_terms):
+            if all(x is y for x, y in zip(new_terms, terms)):
+                P._normal |= _NEG_PUSHED
+                return P
+            return Prop(P.get_op(), *new_terms)
+        return [(sub,) for sub in terms], combine
     
     if P.get_op() == '~':
         term = P.get_terms()[0]
-        if term.is_atomic():
-            return S
-
         if term.get_op() == '&':
-            return Prop('|', *[push_neg(~sub) for sub in term.get_terms()])
+            return [(~sub,) for sub in term.get_terms()], lambda subs: Prop('|', *subs)
         if term.get_op() == '|':
-            return Prop('&', *[push_neg(~sub) for sub in term.get_terms()])
+            return [(~sub,) for sub in term.get_terms()], lambda subs: Prop('&', *subs)
         if term.get_op() == '~':
-            return push_neg(term.get_terms()[0])
+            return [(term.get_terms()[0],)], lambda subs: subs[0]
     
     assert(False)
 
-def propagate_hypothesis(P, domain=set()):
+@instrumented('propagate_hypothesis')
+def propagate_hypothesis(P, domain=frozenset()):
+    return postorder((P, frozenset(domain)), _propagate_step,
+                     cache_for('propagate_hypothesis'))
+
+def _propagate_step(task):
+    """Step of propagate_hypothesis: the literals of domain, and those
+    of the enclosing operations, replaced by their value."""
+    P, domain = task
     positive = set()
     negative = set()
     for e in domain:
         if e == __falseProp:
-            return __falseProp
+            return None, __falseProp
         if e.is_atomic():
             positive.add(e)
         else:
             negative.add(~e)
     if len(positive & negative) > 0:
-        return __falseProp
+        return None, __falseProp
     
     if P.is_literal():
         if simplify_term(~P) in domain:
-            return __falseProp
+            return None, __falseProp
         if P in domain:
-            return __trueProp
-        return P
+            return None, __trueProp
+        return None, P
+
+    if not domain and P._normal & _PROPAGATED:
+        return None, P
 
     if P.get_op() in ['~']:
-        return Prop('~', propagate_hypothesis(P.get_terms()[0], domain))
+        sub = P.get_terms()[0]
+        def combine(results):
+            if results[0] is sub:
+                if not domain:
+                    P._normal |= _PROPAGATED
+                return P
+            return Prop('~', results[0])
+        return [(sub, domain)], combine
 
     if P.get_op() in ['&', '|']:
+        changed = False
         new_terms = []
         old_terms = []
         new_domain = set()
         for e in P.get_terms():
             if simplify_term(~e) in domain:
                 new_terms.append(__falseProp)
+                changed = True
             else:
                 if e in domain:
                     new_terms.append(__trueProp)
+                    changed = True
                 else:
                     if e.is_literal():
                         new_terms.append(e)
@@ -198,74 +303,112 @@ def propagate_hypothesis(P, domain=set()):
 
         for e in domain:
             new_domain.add(e)
+        new_domain = frozenset(new_domain)
         
-        return Prop(P.get_op(), *(new_terms + [propagate_hypothesis(sub, new_domain) for sub in old_terms]))
+        def combine(propagated):
+            if not changed and all(x is y for x, y in zip(propagated, old_terms)):
+                if not domain:
+                    P._normal |= _PROPAGATED
+                return P
+            return Prop(P.get_op(), *(new_terms + propagated))
+        return [(sub, new_domain) for sub in old_terms], combine
 
     assert(False)
 
+@memoized('factor_literals')
+def _factor_literals(term):
+    """(positive, raw): the literals of term (itself if it is a literal,
+    else its terms) up to their sign, and as they are."""
+    if term.is_literal():
+        return frozenset([term if term.is_atomic() else simplify_term(~term)]), frozenset([term])
+    positive = []
+    for sub in term.get_terms():
+        positive.append(sub if sub.is_positive() else simplify_term(~sub))
+    return frozenset(positive), term.get_terms()
+
+class _Counts(object):
+    """Occurrence lists of literals among numbered terms, with a bucket
+    queue of the literals by number of occurrences, so that the most
+    frequent one is found without sorting."""
+
+    def __init__(self, occurrences):
+        self.occurrences = occurrences
+        # number of occurrences -> the literals with that many
+        self.top = max([len(occ) for occ in occurrences.values()] or [0])
+        self.buckets = [set() for _ in range(self.top + 1)]
+        for lit, occ in occurrences.items():
+            self.buckets[len(occ)].add(lit)
+
+    def best(self):
+        """(literal, count) for a most frequent literal, or (None, 0)."""
+        if self.top == 0:
+            return None, 0
+        return next(iter(self.buckets[self.top])), self.top
+
+def _occurrences(terms):
+    """(positive, raw): the _Counts of the literals of the numbered terms,
+    up to their sign and as they are."""
+    positive = {}
+    raw = {}
+    for i, term in enumerate(terms):
+        pos, r = _factor_literals(term)
+        for x in pos:
+            positive.setdefault(x, set()).add(i)
+        for x in r:
+            raw.setdefault(x, set()).add(i)
+    return _Counts(positive), _Counts(raw)
+
 def factor_local(P):
+    """Factors the terms of P sharing the most frequent literal X (up to
+    its sign if it occurs in more than two terms, as it is otherwise) as
+    (X & them under X) | (~X & them under ~X). Returns P itself if no
+    literal occurs twice."""
     if P.is_literal():
         return P
 
-    subterms = []
-    for term in P.get_terms():
-        if term.is_literal():
-            if term.is_atomic():
-                subterms.append([{term}, {term}, term])
-            else:
-                subterms.append([{simplify_term(~term)}, {term}, term])
-        else:
-            sub_p = set()
-            sub_p_raw = set()
-            for sub in term.get_terms():
-                if sub.is_positive():
-                    sub_p.add(sub)
-                    sub_p_raw.add(sub)
-                else:
-                    sub_p.add(simplify_term(~sub))
-                    sub_p_raw.add(sub)
-            subterms.append([sub_p, sub_p_raw, term])
-    
-    counts = {}
-    counts_raw = {}
-    for s, r, _ in subterms:
-        for ss in s:
-            if ss not in counts:
-                counts[ss] = 0
-            counts[ss] += 1
-        for sr in r:
-            if sr not in counts_raw:
-                counts_raw[sr] = 0
-            counts_raw[sr] += 1
-    
-    sp = counts.keys()
-    sp.sort(key = lambda x: counts[x], reverse=True)
-    if counts[sp[0]] <= 2:
-        sp = counts_raw.keys()
-        sp.sort(key = lambda x: counts_raw[x], reverse=True)
-        if counts_raw[sp[0]] < 2:
+    terms = P.get_terms()
+    positive, raw = _occurrences(terms)
+    X, n = positive.best()
+    counts = positive
+    if n <= 2:
+        X, n = raw.best()
+        counts = raw
+        if n < 2:
             return P
-        else:
-            to_keep = [x[2] for x in subterms if sp[0] not in x[1]]
-            to_factor = Prop(P.get_op(), *[x[2] for x in subterms if sp[0] in x[1]])
-            return Prop(P.get_op(), (sp[0] & propagate_hypothesis(to_factor, {sp[0]})) | \
-                                     (~sp[0] & propagate_hypothesis(to_factor, {simplify_term(~sp[0])})), *to_keep)
-    
-    to_keep = [x[2] for x in subterms if sp[0] not in x[0]]
-    to_factor = Prop(P.get_op(), *[x[2] for x in subterms if sp[0] in x[0]])
-    return Prop(P.get_op(), (sp[0] & propagate_hypothesis(to_factor, {sp[0]})) | \
-                            (~sp[0] & propagate_hypothesis(to_factor, {simplify_term(~sp[0])})), *to_keep)
 
+    factored = counts.occurrences[X]
+    to_factor = Prop(P.get_op(), *[terms[i] for i in sorted(factored)])
+    combo = (X & propagate_hypothesis(to_factor, {X})) | \
+            (~X & propagate_hypothesis(to_factor, {simplify_term(~X)}))
+    return Prop(P.get_op(), combo, *[term for i, term in enumerate(terms)
+                                     if i not in factored])
+
+@instrumented('factor_at_top')
 def factor_at_top(P):
+    return postorder((P,), _factor_step)
+
+def _factor_step(task):
+    """Step of factor_at_top: factor_local at the topmost nodes where it
+    applies."""
+    P = task[0]
     if P.is_literal():
-        return P
+        return None, P
     
+    if P._normal & _FACTORED:
+        return None, P
+
     factored = factor_local(P)
 
     if factored is not P:
-        return factored
+        return None, factored
     
-    return Prop(P.get_op(), *[factor_at_top(sub) for sub in P.get_terms()])
+    terms = P.get_terms()
+    def combine(new_terms):
+        if all(x is y for x, y in zip(new_terms, terms)):
+            P._normal |= _FACTORED
+            return P
+        return Prop(P.get_op(), *new_terms)
+    return [(sub,) for sub in terms], combine
 
 def simplify_basic(P):
     res = associative_collect(P)
@@ -274,18 +417,88 @@ def simplify_basic(P):
     res = associative_collect(res)
     return simplify_everywhere(res)
 
-def simplify_pure(P):
-    """Apply various strategies until reaching fixed point."""
+def components(P):
+    """Groups the terms of P into lists of terms sharing variables, so
+    that two terms of different groups have no variable in common (using
+    a union-find over the variable names)."""
+    parent = {}
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    terms = P.get_terms()
+    names = []
+    for term in terms:
+        vs = [v.name for v in term.var_stats()]
+        for v in vs:
+            parent.setdefault(v, v)
+        for v in vs[1:]:
+            a, b = find(vs[0]), find(v)
+            if a != b:
+                parent[a] = b
+        names.append(vs)
+
+    groups = []
+    index = {}
+    for term, vs in zip(terms, names):
+        if not vs:
+            groups.append([term])
+            continue
+        root = find(vs[0])
+        if root not in index:
+            index[root] = len(groups)
+            groups.append([])
+        groups[index[root]].append(term)
+    return groups
+
+@instrumented('simplify_pure')
+def simplify_pure(P, bound=None, end=None):
+    """Apply various strategies until reaching fixed point.
+    Every pass returns its argument itself when it has nothing to rewrite,
+    and flags it as such (see Prop._normal), so convergence is detected by
+    identity and unchanged subterms are skipped on later iterations.
+    If bound is given, returns None as soon as a fixed point of the
+    rewriting passes is larger than bound, before trying to factor it.
+    If end (a time.time() value) is given, raises OutOfBudget when an
+    iteration starts after it.
+    The variable-disjoint components of a conjunction or disjunction are
+    simplified separately."""
     res = simplify_basic(P)
+
+    if not res.is_literal() and res.get_op() != '~':
+        groups = components(res)
+        if len(groups) > 1:
+            parts = []
+            changed = False
+            for group in groups:
+                whole = Prop(res.get_op(), *group) if len(group) > 1 else group[0]
+                part = simplify_pure(whole, bound, end)
+                if part is None:
+                    return None
+                changed = changed or part is not whole
+                parts.append(part)
+            if not changed:
+                return res
+            res = simplify_everywhere(associative_collect(Prop(res.get_op(), *parts)))
+            if bound is not None and res.size() > bound:
+                return None
+            return res
     
     old = res
     res = propagate_hypothesis(res)
     while True:
+        if end is not None and time.time() > end:
+            raise OutOfBudget()
         res = associative_collect(res)
         res = simplify_everywhere(res)
-        if old == res:
+        if old is res:
+            if bound is not None and res.size() > bound:
+                return None
             res = factor_at_top(res)
-            if res == old:
+            if res is old:
                 break
             res = simplify_everywhere(res)
             res = associative_collect(res)
@@ -294,76 +507,170 @@ def simplify_pure(P):
 
     return res
 
-def hypo(P, X):
-    return simplify_pure((X & propagate_hypothesis(P, {X}))|((~X & propagate_hypothesis(P, {~X}))))
-
-def hypo2(P, X, Y):
-    return simplify_pure((X & Y & propagate_hypothesis(P, {X, Y})) | \
-                    (~X & Y & propagate_hypothesis(P, {~X, Y})) | \
-                    (X & ~Y & propagate_hypothesis(P, {X, ~Y})) | \
-                    (~X & ~Y & propagate_hypothesis(P, {~X, ~Y})))
-
-def hypo3(P, X, Y, Z):
-    return simplify_pure((X & Y & Z & propagate_hypothesis(P, {X, Y, Z})) | \
-                    (~X & Y & Z & propagate_hypothesis(P, {~X, Y, Z})) | \
-                    (X & ~Y & Z & propagate_hypothesis(P, {X, ~Y, Z})) | \
-                    (~X & ~Y & Z & propagate_hypothesis(P, {~X, ~Y, Z})) | \
-                    (X & Y & ~Z & propagate_hypothesis(P, {X, Y, ~Z})) | \
-                    (~X & Y & ~Z & propagate_hypothesis(P, {~X, Y, ~Z})) | \
-                    (X & ~Y & ~Z & propagate_hypothesis(P, {X, ~Y, ~Z})) | \
-                    (~X & ~Y & ~Z & propagate_hypothesis(P, {~X, ~Y, ~Z})))
-
-def ultra_simplify(P, depth=2):
+def cofactor(P, lit):
+    """P under the hypothesis lit, with the resulting constants simplified."""
+    return simplify_everywhere(propagate_hypothesis(P, {lit}))
+
+def hypo_n(P, vars_, bound=None, end=None):
+    """Case split of P on all the assignments of the variables of vars_:
+    the disjunction of (assignment & P under the assignment), simplified.
+    The cofactors are computed one variable at a time, so assignments
+    sharing a prefix share its cofactor, and contradictory branches are
+    dropped. Returns None if the split is given up for being larger than
+    bound, and raises OutOfBudget past end (see simplify_pure)."""
+    branches = []
+
+    def split(C, lits, rest):
+        if C == __falseProp:
+            return
+        if end is not None and time.time() > end:
+            raise OutOfBudget()
+        if not rest:
+            branches.append(Prop('&', *(lits + [C])))
+            return
+        X = rest[0]
+        split(cofactor(C, X), lits + [X], rest[1:])
+        split(cofactor(C, ~X), lits + [~X], rest[1:])
+
+    split(P, [], list(vars_))
+    if not branches:
+        return __falseProp
+    return simplify_pure(Prop('|', *branches), bound, end)
+
+def hypo(P, X, bound=None):
+    return hypo_n(P, [X], bound)
+
+def hypo2(P, X, Y, bound=None):
+    return hypo_n(P, [X, Y], bound)
+
+def hypo3(P, X, Y, Z, bound=None):
+    return hypo_n(P, [X, Y, Z], bound)
+
+def cutoff(min_size):
+    """Bound passed to the case splits while min_size is the best size."""
+    if BOUND_SLACK is None:
+        return None
+    return int(BOUND_SLACK*min_size)
+
+class OutOfBudget(Exception):
+    pass
+
+class Budget(object):
+    """Allowance of an anytime simplification: deadline is a number of
+    seconds from now, and max_steps a number of case splits (calls of
+    hypo_n). Either can be None, for no limit. exhausted tells whether
+    the budget ran out. The deadline is also checked within the case
+    splits, which are given end, the time it passes; end can be given
+    instead of deadline."""
+
+    def __init__(self, deadline=None, max_steps=None, end=None):
+        if deadline is not None:
+            end = time.time() + deadline
+        self.end = end
+        self.max_steps = max_steps
+        self.steps = 0
+        self.exhausted = False
+
+    def spend(self, n=1):
+        """Accounts for n case splits and returns True, or returns False
+        if they do not fit in the budget."""
+        if self.max_steps is not None and self.steps + n > self.max_steps or \
+           self.end is not None and time.time() > self.end:
+            self.exhausted = True
+            return False
+        self.steps += n
+        return True
+
+    def take(self, n):
+        """Accounts for as many of n case splits as fit in the budget,
+        and returns their number."""
+        if self.end is not None and time.time() > self.end:
+            self.exhausted = True
+            return 0
+        if self.max_steps is not None and self.steps + n > self.max_steps:
+            self.exhausted = True
+            n = max(0, self.max_steps - self.steps)
+        self.steps += n
+        return n
+
+def best_candidate(P, candidates, pool=None, budget=None):
+    """Returns the smallest of the case splits of P on the variable tuples
+    of candidates (the first one on ties), or None if none is smaller
+    than P. With a HypothesisPool, the candidates are evaluated in
+    parallel with the same result. If budget (a Budget) runs out before
+    the candidates are all tried, returns the best one so far, or raises
+    OutOfBudget if there is none."""
+    end = budget.end if budget is not None else None
+    if pool is not None and pool.worth(candidates):
+        n = budget.take(len(candidates)) if budget is not None else len(candidates)
+        candidate, complete = pool.best_candidate(P, candidates[:n], end)
+        if not complete or n < len(candidates):
+            budget.exhausted = True
+            if candidate is None:
+                raise OutOfBudget()
+        return candidate
+
+    min_size = P.size()
+    candidate = None
+    for vars_ in candidates:
+        if budget is not None and not budget.spend():
+            if candidate is None:
+                raise OutOfBudget()
+            break
+        try:
+            c = hypo_n(P, vars_, cutoff(min_size), end)
+        except OutOfBudget:
+            budget.exhausted = True
+            if candidate is None:
+                raise
+            break
+        if c is not None and c.size() < min_size:
+            min_size = c.size()
+            candidate = c
+    return candidate
+
+@instrumented('ultra_simplify')
+def ultra_simplify(P, depth=2, pool=None, budget=None):
     """P should always be in simplified form. The depth
         parameter controls the size of the hypothesis, the
         running time is directly proportional to #atoms^depth, so
-        use with precaution."""
+        use with precaution (3 or 4 at most). Candidates are
+        evaluated on pool (a parallel.HypothesisPool) if given,
+        within budget (a Budget) if given."""
     if P.size() < 6:
         return None
     
-    vars_ = P.var_stats().keys()
+    if P.get_op() != '~':
+        groups = components(P)
+        if len(groups) > 1:
+            return ultra_simplify_components(P, groups, depth, pool, budget)
     
-    #try first order
-    min_size = P.size()
-    for var in vars_:
-        c = hypo(P, var)
-        if c.size() < min_size:
-            min_size = c.size()
-            candidate = c
-    
-    if min_size < P.size():
-        return candidate
+    # most frequent variables first: their case splits tend to win, and
+    # finding a small candidate early tightens the cutoff (if any) for the
+    # others
+    stats = P.var_stats()
+    vars_ = sorted(stats.keys(), key=lambda v: stats[v][0]+stats[v][1], reverse=True)
     
-    if depth > 1:
-        #try second order
-        for i in range(len(vars_)):
-            for j in range(i+1, len(vars_)):
-                c = hypo2(P, vars_[i], vars_[j])
-                if c.size() < min_size:
-                    min_size = c.size()
-                    candidate = c
-        
-        if min_size < P.size():
-            return candidate
-    
-    if depth > 2:
-        #try third order
-        for i in range(len(vars_)):
-            for j in range(i+1, len(vars_)):
-                for k in range(j+1, len(vars_)):
-                    c = hypo3(P, vars_[i], vars_[j], vars_[k])
-                    if c.size() < min_size:
-                        min_size = c.size()
-                        candidate = c
-        
-        if min_size < P.size():
+    # try hypotheses on 1, 2, ..., depth variables
+    for order in range(1, depth+1):
+        candidate = best_candidate(P, list(itertools.combinations(vars_, order)),
+                                   pool, budget)
+        if candidate is not None:
             return candidate
     
     # end by simplifying down the tree
     new_terms = []
     old_terms = []
-    for sub in P.get_terms():
-        x = ultra_simplify(sub, depth)
+    terms = P.get_terms()
+    for i, sub in enumerate(terms):
+        try:
+            x = ultra_simplify(sub, depth, pool, budget)
+        except OutOfBudget:
+            if not new_terms:
+                raise
+            # keep the terms improved so far
+            old_terms += terms[i:]
+            break
         if x is not None:
             new_terms.append(x)
         else:
@@ -374,10 +681,115 @@ def ultra_simplify(P, depth=2):
     
     return None
 
-def simplify(P, depth=2):
-    res = simplify_pure(P)
-    while True:
-        res_new = ultra_simplify(res)
-        if res_new is None:
+def ultra_simplify_components(P, groups, depth=2, pool=None, budget=None):
+    """ultra_simplify of P, given its variable-disjoint groups of terms
+    (see components): the hypotheses are only searched within each
+    group, in parallel over the groups if there are enough of them
+    (every group is then given the deadline, and an equal share of the
+    case splits left)."""
+    parts = [Prop(P.get_op(), *group) if len(group) > 1 else group[0]
+             for group in groups]
+    if pool is not None and len(parts) >= pool.workers:
+        if budget is None:
+            new_parts, steps, exhausted = pool.ultra_simplify_all(parts, depth)
+        else:
+            if not budget.spend(0):
+                raise OutOfBudget()
+            share = None
+            if budget.max_steps is not None:
+                share = (budget.max_steps - budget.steps) // len(parts)
+            new_parts, steps, exhausted = pool.ultra_simplify_all(parts, depth,
+                                                                  budget.end, share)
+            budget.steps += steps
+            if exhausted:
+                budget.exhausted = True
+                if all(x is None for x in new_parts):
+                    raise OutOfBudget()
+    else:
+        new_parts = []
+        for part in parts:
+            try:
+                new_parts.append(ultra_simplify(part, depth, pool, budget))
+            except OutOfBudget:
+                if all(x is None for x in new_parts):
+                    raise
+                new_parts += [None]*(len(parts) - len(new_parts))
+                break
+    if all(x is None for x in new_parts):
+        return None
+    return simplify_pure(Prop(P.get_op(), *[new if new is not None else old
+                                            for new, old in zip(new_parts, parts)]))
+
+def simplify_iter(P, depth=2, workers=1, deadline=None, max_steps=None, budget=None):
+    """Generator of the successive results of simplify: simplify_pure(P)
+    (preprocessed first if it is a conjunction of clauses once flattened,
+    see cnf.py), then every smaller proposition found by ultra_simplify,
+    until it finds nothing or the budget runs out (see Budget). Every
+    result is equivalent to P. The budget is checked between case splits,
+    and the deadline within them as well, but neither bounds the first
+    simplify_pure. A Budget can be given instead of deadline and
+    max_steps. If the SAT solver finds that P is constant, the constant is
+    the only result."""
+    if SAT_PRECHECK_CONFLICTS:
+        const = sat.constant_value(P, SAT_PRECHECK_CONFLICTS)
+        if const is not None:
+            yield const
+            return
+    if budget is None:
+        budget = Budget(deadline, max_steps)
+    pool = None
+    if workers > 1:
+        from parallel import HypothesisPool
+        pool = HypothesisPool(workers)
+    try:
+        res = simplify_basic(P)
+        if cnf.is_cnf(res):
+            # the propagation of the units into other terms can be
+            # quadratic in their depth
+            res = cnf.preprocess(res)
+        res = simplify_pure(res)
+        yield res
+        while True:
+            try:
+                res_new = ultra_simplify(res, depth, pool, budget)
+            except OutOfBudget:
+                return
+            if res_new is None:
+                return
+            if res_new.size() < res.size():
+                yield res_new
+            res = res_new
+    finally:
+        if pool is not None:
+            pool.close()
+
+def simplify(P, depth=2, workers=1, verify=False, deadline=None, max_steps=None,
+             cache=None):
+    """Simplifies P until ultra_simplify cannot improve it. With workers > 1,
+    the hypothesis candidates are evaluated on that many processes.
+    With verify, the result is checked to be equivalent to P whenever P
+    is small enough for a truth table (see truthtable.MAX_VARS).
+    With a deadline (in seconds) or a maximum number of case splits,
+    returns the smallest result found when the budget runs out (see
+    simplify_iter).
+    With a cache (a persistent.PersistentCache), the result is looked up
+    there first, and stored there unless the budget ran out."""
+    if verify:
+        res = simplify(P, depth, workers, deadline=deadline, max_steps=max_steps,
+                       cache=cache)
+        if len(truthtable.variables(P)) <= truthtable.MAX_VARS and \
+           not truthtable.is_equivalent(P, res):
+            raise NameError("Simplification changed the meaning of: "+repr(P))
+        return res
+
+    if cache is not None:
+        res = cache.get(P, depth)
+        if res is not None:
             return res
-        res = res_new
+
+    budget = Budget(deadline, max_steps)
+    for res in simplify_iter(P, depth, workers, budget=budget):
+        pass
+    if cache is not None and not budget.exhausted:
+        cache.put(P, res, depth)
+    return res
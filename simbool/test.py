@@ -1,6 +1,59 @@
+import io
+import itertools
+import multiprocessing
+import os
+import pickle
+import random
+import tempfile
+import time
 import unittest
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+import proposition
 from proposition import *
 from simplify import *
+from memo import *
+from parallel import HypothesisPool
+from truthtable import *
+import bdd
+from dimacs import *
+from parse import parse, parse_lines, Parser
+from dag import DAG
+import instrument
+import persistent
+from persistent import PersistentCache
+from canonical import canonical_form, rename
+import sat
+import cnf
+from espresso import minimize_sop, minimize_pos
+from shared import write_shared, read_shared, parse_shared, SharedWriter
+
+def _store_results(args):
+    """Fills the cache at path from a worker process."""
+    path, n = args
+    cache = PersistentCache(path, up_to_renaming=False)
+    for i in range(n):
+        P = Prop('A%d' % i) | ~Prop('B%d' % i)
+        cache.put(P, P)
+    return len([i for i in range(n) if cache.get(Prop('A%d' % i) | ~Prop('B%d' % i)) is not None])
+
+def brute_force_table(P, names):
+    """Values of P under every assignment of names, by brute force."""
+    def ev(P, env):
+        if P.is_atomic():
+            return P.name if P.name in [True, False] else env[P.name]
+        if P.get_op() == '~':
+            return not ev(P.get_terms()[0], env)
+        if P.get_op() == '&':
+            return all(ev(x, env) for x in P.get_terms())
+        return any(ev(x, env) for x in P.get_terms())
+    res = []
+    for i in range(2**len(names)):
+        env = dict((n, bool(i >> k & 1)) for k, n in enumerate(names))
+        res.append(ev(P, env))
+    return res
 
 class TestSet(unittest.TestCase):
     def setUp(self):
@@ -114,5 +167,797 @@ class TestSet(unittest.TestCase):
             self.assertEqual(expr.is_atomic(), atomic[i])
             i += 1
 
+    def test_interning(self):
+        A = intern_prop('A')
+        B = intern_prop('B')
+        P = intern_prop('|', intern_prop('&', A, B), Prop('~', Prop('A')))
+        Q = intern_prop('|', Prop('~', A), Prop('&', Prop('B'), Prop('A')))
+        self.assertTrue(P is Q)
+        self.assertTrue(intern_tree((A & B) | ~A) is P)
+        self.assertEqual(P, (Prop('A') & Prop('B')) | ~Prop('A'))
+        self.assertNotEqual(intern_prop('&', A, B), intern_prop('|', A, B))
+        self.assertNotEqual(Prop('&', A, B), Prop('|', A, B))
+
+        previous = set_interning(True)
+        try:
+            self.assertTrue(Prop('A') is A)
+            self.assertTrue(~A & B is intern_prop('&', B, intern_prop('~', A)))
+            for expr in self.cases:
+                self.assertEqual(simplify_basic(expr),
+                                 simplify_basic(intern_tree(expr)))
+        finally:
+            set_interning(previous)
+
+        self.assertFalse(Prop('A') is A)
+        self.assertFalse(Prop('A')._interned)
+        self.assertEqual(Prop('&', Prop('A'), B), A & B)
+        key = ('&', frozenset([intern_prop('Z1'), intern_prop('Z2')]))
+        intern_prop('&', Prop('Z1'), Prop('Z2'))
+        self.assertTrue(key not in proposition._unique_table)
+
+    def test_memo(self):
+        cache = LRUCache(2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertTrue('b' not in cache)
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 1,
+                                         'size': 2, 'maxsize': 2})
+        cache.resize(1)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get('a', 0), 0)
+
+        A, B, C = [Prop(x) for x in "ABC"]
+        P = ~A | (C & (~(B & ~C) | A))
+        clear_caches()
+        res = simplify(P)
+        misses = cache_stats()['propagate_hypothesis']['misses']
+        self.assertEqual(simplify(P), res)
+        self.assertEqual(cache_stats()['propagate_hypothesis']['misses'], misses)
+        self.assertTrue(cache_stats()['propagate_hypothesis']['hits'] > 0)
+
+        set_cache_size(0)
+        try:
+            for expr in self.cases:
+                self.assertEqual(simplify_basic(expr), simplify_basic(expr))
+            self.assertEqual(simplify(P), res)
+            self.assertEqual(len(caches['simplify_term']), 0)
+        finally:
+            set_cache_size(DEFAULT_MAXSIZE)
+            clear_caches()
+
+    def test_incremental(self):
+        clear_caches()
+        A, B, C, D = [Prop(x) for x in "ABCD"]
+        P = simplify_pure((A | B) & (C | ~D) & (A | ~C))
+        self.assertTrue(associative_collect(P) is P)
+        self.assertTrue(simplify_everywhere(P) is P)
+        self.assertTrue(push_neg(P) is P)
+        self.assertTrue(propagate_hypothesis(P) is P)
+        self.assertTrue(simplify_pure(P) is P)
+
+        Q = (A & (B & C)) | D
+        R = associative_collect(Q)
+        self.assertEqual(R, Prop('|', Prop('&', A, B, C), D))
+        self.assertTrue(associative_collect(R) is R)
+
+        # a cache hit on an equal argument left unchanged gives back that
+        # argument, not the equal object cached first
+        X = Prop('|', A, Prop('&', B, C))
+        Y = Prop('|', Prop('A'), Prop('&', Prop('B'), Prop('C')))
+        for f in [simplify_term, simplify_everywhere, propagate_hypothesis]:
+            self.assertTrue(f(X) is X)
+            self.assertTrue(f(Y) is Y)
+
+        set_cache_size(0)
+        try:
+            for expr in self.cases + [P, Q, ~A | (C & (~(B & ~C) | A))]:
+                res = simplify_pure(expr)
+                self.assertTrue(simplify_pure(res) is res)
+        finally:
+            set_cache_size(DEFAULT_MAXSIZE)
+
+    def test_parallel(self):
+        A, B, C, D, E = [Prop(x) for x in "ABCDE"]
+        exprs = [~A | (C & (~(B & ~C) | A)),
+                 (C & A) | (C & B) | (A & ~B),
+                 (A | B | ~C) & (~A | D | E) & (B | ~D | ~E) & (C | ~B | E) & (~A | ~B | D)]
+        with HypothesisPool(2, min_candidates=1) as pool:
+            for expr in exprs:
+                res = simplify_pure(expr)
+                for depth in [1, 2, 3]:
+                    self.assertEqual(ultra_simplify(res, depth, pool),
+                                     ultra_simplify(res, depth))
+            # past the deadline, the workers stop
+            self.assertEqual(pool.best_candidate(res, [(A,), (B,)], time.time() - 1),
+                             (None, False))
+        self.assertEqual(simplify(exprs[2], workers=2), simplify(exprs[2]))
+
+        # the groups of variable-disjoint terms share the budget
+        part = simplify_pure(exprs[2])
+        parts = [rename(part, dict((x, x + str(i)) for x in "ABCDE")) for i in range(3)]
+        P = Prop('&', *parts)
+        with HypothesisPool(2) as pool:
+            for n in [0, 1, 4, 10]:
+                budget = Budget(max_steps=n)
+                try:
+                    res = ultra_simplify(P, 2, pool, budget)
+                    self.assertTrue(res is None or is_equivalent(res, P))
+                except OutOfBudget:
+                    pass
+                self.assertTrue(budget.steps <= n)
+            res, steps, exhausted = pool.ultra_simplify_all(parts, 2, time.time() - 1)
+            self.assertEqual((res, steps, exhausted), ([None]*3, 0, True))
+
+    def test_bounded_search(self):
+        A, B, C, D, E = [Prop(x) for x in "ABCDE"]
+        P = (A | B | ~C) & (~A | D | E) & (B | ~D | ~E) & (C | ~B | E) & (~A | ~B | D)
+        res = simplify_pure(P)
+        self.assertEqual(simplify_pure(P, res.size()), res)
+        self.assertEqual(simplify_pure(P, 1), None)
+        self.assertEqual(hypo2(res, A, B, 1), None)
+        self.assertEqual(cutoff(10), None)
+
+        import simplify as simplify_module
+        unbounded = simplify(P)
+        simplify_module.BOUND_SLACK = 2.5
+        try:
+            self.assertEqual(cutoff(10), 25)
+            self.assertEqual(simplify(P).size(), unbounded.size())
+        finally:
+            simplify_module.BOUND_SLACK = None
+
+    def test_anytime(self):
+        A, B, C, D, E, F = [Prop(x) for x in "ABCDEF"]
+        P = (~B | ~C | F) & (B | ~C | D) & (~C | ~E | F) & (~C | D | ~F) & (~C | ~D | ~E) & \
+            (~A | ~D | ~E) & (A | B | ~E) & (~B | ~E | F) & (~A | E | F) & (~A | B | ~D)
+        results = list(simplify_iter(P))
+        self.assertEqual(results[0], simplify_pure(P))
+        self.assertEqual(results[-1], simplify(P))
+        sizes = [x.size() for x in results]
+        self.assertEqual(sizes, sorted(set(sizes), reverse=True))
+        self.assertTrue(len(results) > 1)
+
+        self.assertEqual(simplify(P, max_steps=0), results[0])
+        self.assertEqual(simplify(P, deadline=0), results[0])
+        steps = [simplify(P, max_steps=n).size() for n in range(0, 40, 5)]
+        self.assertEqual(steps, sorted(steps, reverse=True))
+        self.assertTrue(steps[-1] < steps[0])
+        for n in [1, 3, 10]:
+            self.assertTrue(is_equivalent(simplify(P, max_steps=n), P))
+
+        budget = Budget(max_steps=2)
+        self.assertTrue(budget.spend() and budget.spend(1))
+        self.assertFalse(budget.spend())
+        self.assertRaises(OutOfBudget, best_candidate, P, [(A,), (B,)], None, budget)
+        budget = Budget(max_steps=5)
+        self.assertEqual([budget.take(3), budget.take(3), budget.take(3)], [3, 2, 0])
+        self.assertTrue(budget.exhausted)
+
+        # the deadline is checked within the case splits as well
+        past = time.time() - 1
+        self.assertRaises(OutOfBudget, simplify_pure, P, None, past)
+        self.assertRaises(OutOfBudget, hypo_n, P, [A], None, past)
+        self.assertEqual(simplify_pure(P, None, time.time() + 600), results[0])
+        budget = Budget(deadline=600)
+        budget.end = past
+        self.assertRaises(OutOfBudget, best_candidate, results[0], [(A,), (B,)], None, budget)
+        self.assertTrue(budget.exhausted)
+
+    def test_persistent(self):
+        A, B, C, D = [Prop(x) for x in "ABCD"]
+        P = (A | B) & (~C | (D & A))
+        Q = (~C | (A & D)) & (B | A)
+        self.assertEqual(persistent.canonical_key(P), persistent.canonical_key(Q))
+        self.assertNotEqual(persistent.canonical_key(P), persistent.canonical_key(P | C))
+        self.assertNotEqual(persistent.canonical_key(A & B), persistent.canonical_key(A | B))
+        for x in [P, A, Prop(True), ~(A & ~A), Prop('&', P)]:
+            self.assertEqual(persistent.loads(persistent.dumps(x)), x)
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'cache.db')
+        cache = PersistentCache(path, maxsize=3, up_to_renaming=False)
+        self.assertEqual(cache.get(P), None)
+        res = simplify(P, cache=cache)
+        self.assertEqual(cache.get(Q), res)
+        self.assertEqual(cache.get(Q, depth=1), None)
+        simplify(P, max_steps=0, cache=cache, depth=3)
+        self.assertEqual(cache.get(P, depth=3), None)
+        self.assertEqual(simplify(Q, cache=PersistentCache(path)), res)
+        for x in [A, B, C]:
+            cache.put(x, x)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.get(P), None)
+        cache.put(A, A)
+        self.assertEqual(len(cache), 3)
+        self.assertEqual(cache.get(B), B)
+        cache.close()
+        self.assertEqual(len(PersistentCache(path, version='other')), 0)
+
+        pool = multiprocessing.Pool(4)
+        try:
+            counts = pool.map(_store_results, [(path, 20)]*4)
+        finally:
+            pool.terminate()
+        self.assertEqual(counts, [20]*4)
+        self.assertEqual(len(PersistentCache(path)), 20)
+
+        cache = PersistentCache(path)
+        cache.clear()
+        X, Y, Z, T = [Prop(x) for x in "XYZT"]
+        self.assertEqual(simplify(P, cache=cache), res)
+        self.assertEqual(cache.get((~Z | (X & T)) & (Y | X)), rename(res, {'A': 'X', 'B': 'Y', 'C': 'Z', 'D': 'T'}))
+        self.assertEqual(len(cache), 1)
+
+    def test_canonical(self):
+        A, B, C, D = [Prop(x) for x in "ABCD"]
+        for P in [(A | ~B) & C, A | B | C, (A | B) & (~B | C) & (~C | A) & Prop(True),
+                  (A & ~A) | (B & (C | ~D)) | (~A & ~C & D), Prop('&', A), Prop(False)]:
+            C1, renaming = canonical_form(P)
+            self.assertEqual(rename(C1, renaming), P)
+            self.assertTrue(all(x.name in renaming for x in C1.var_stats() if x.name not in [True, False]))
+            names = sorted(renaming.values())
+            for permutation in itertools.permutations(names):
+                Q = rename(P, dict(zip(names, permutation)))
+                self.assertEqual(canonical_form(Q)[0], C1)
+        self.assertNotEqual(canonical_form(A | ~B)[0], canonical_form(A | B)[0])
+        # the renaming is a bijection from x0, x1... onto the variables,
+        # and variables told apart by their occurrences keep their names
+        # under any renaming of P
+        P = (A | ~B) & C
+        C1, renaming = canonical_form(P)
+        self.assertEqual(sorted(renaming), ['x0', 'x1', 'x2'])
+        self.assertEqual(sorted(renaming.values()), ['A', 'B', 'C'])
+        for permutation in itertools.permutations('ABC'):
+            mapping = dict(zip('ABC', permutation))
+            C2, renaming2 = canonical_form(rename(P, mapping))
+            self.assertEqual(C2, C1)
+            self.assertEqual(renaming2, dict((x, mapping[v]) for x, v in renaming.items()))
+
+    def test_sat(self):
+        A, B, C, D = [Prop(x) for x in "ABCD"]
+        props = [A & ~A, A | ~A, (A | B) & (A | ~B) & (~A | C) & ~C, (A > B) > ((B > C) > (A > C)),
+                 (A | B | C) & (~A | ~B) & (~B | ~C) & (~A | ~C), Prop(True), Prop(False) | D,
+                 (A & B) | (~A & ~B) | (A & ~B) | (~A & B) | (C & D)]
+        for P in props:
+            self.assertEqual(sat.is_satisfiable(P), not is_contradiction(P))
+            self.assertEqual(sat.is_tautology(P), is_tautology(P))
+            self.assertEqual(sat.is_contradiction(P), is_contradiction(P))
+            assignment = sat.satisfying_assignment(P)
+            if assignment is not None:
+                self.assertTrue(P.evaluate(assignment))
+            const = sat.constant_value(P)
+            self.assertEqual(const, Prop(True) if is_tautology(P) else
+                                    Prop(False) if is_contradiction(P) else None)
+        self.assertTrue(sat.is_equivalent(A > B, ~B > ~A))
+        self.assertFalse(sat.is_equivalent(A > B, B > A))
+        self.assertEqual(simplify(props[2]), Prop(False))
+        self.assertEqual(simplify(props[3]), Prop(True))
+
+        # 6 pigeons do not fit in 5 holes
+        x = lambda i, j: Prop('p%d_%d' % (i, j))
+        clauses = [Prop('|', *[x(i, j) for j in range(5)]) for i in range(6)]
+        clauses += [~x(i, j) | ~x(k, j) for j in range(5) for i in range(6) for k in range(i)]
+        self.assertFalse(sat.is_satisfiable(Prop('&', *clauses)))
+        self.assertEqual(sat.is_satisfiable(Prop('&', *clauses), max_conflicts=1), None)
+        self.assertTrue(sat.is_satisfiable(Prop('&', *clauses[1:])))
+
+        solver = sat.Solver()
+        a, b, c = [solver.new_var() for _ in range(3)]
+        for clause in [[a, b], [-a, c], [-b, c]]:
+            solver.add_clause(clause)
+        self.assertTrue(solver.solve())
+        self.assertTrue(solver.model[c])
+        self.assertFalse(solver.solve([-c]))
+        self.assertTrue(solver.solve([-a]))
+        self.assertEqual(solver.model[1:], [False, True, True])
+        self.assertFalse(solver.add_clause([-c]))
+        self.assertFalse(solver.solve())
+
+    def test_cnf(self):
+        A, B, C, D, E = [Prop(x) for x in "ABCDE"]
+        P = A & (~A | B) & (~B | C | D) & (C | D | E) & (C | ~D) & (A | E) & ((B & ~E) | (D & E))
+        Q = cnf.preprocess(P)
+        self.assertTrue(is_equivalent(P, Q))
+        self.assertEqual(Q, Prop('&', A, B, C, (D & E) | ~E))
+        self.assertEqual(cnf.preprocess((A | B) & (A | B | C) & (~A | B | D)), (A | B) & (B | D))
+        self.assertEqual(cnf.preprocess(A & (~A | B) & ~B), Prop(False))
+        self.assertEqual(cnf.preprocess(A & (B | C) & Prop(True)), A & (B | C))
+        for R in [(A | B) & (C | D), A | B, (A & B) | C]:
+            self.assertTrue(cnf.preprocess(R) is R)
+        self.assertEqual(cnf.preprocess((A | ~B) & (A | C) & (~C | D), pure_literals=True), Prop(True))
+        R = Prop('&', A | B, ~A | C, ~C | ~B, ~C | A)
+        self.assertTrue(cnf.preprocess(R, pure_literals=True) is R)
+
+        # random conjunctions of clauses and other terms
+        rnd = random.Random(3)
+        def literal():
+            x = Prop(rnd.choice("ABCDE"))
+            return ~x if rnd.random() < 0.5 else x
+        for _ in range(300):
+            terms = [Prop('|', *[literal() for _ in range(rnd.randint(1, 4))]) if rnd.random() < 0.8
+                     else literal() & (literal() | literal()) for _ in range(rnd.randint(2, 8))]
+            P = Prop('&', *terms)
+            self.assertTrue(is_equivalent(cnf.preprocess(P), P))
+            self.assertEqual(is_contradiction(cnf.preprocess(P, pure_literals=True)), is_contradiction(P))
+
+    def test_factor_local(self):
+        A, B, C, D, E = [Prop(x) for x in "ABCDE"]
+        P = Prop('&', A | B, A | C, A | ~D, ~A | E, B | E)
+        Q = factor_local(P)
+        self.assertTrue(is_equivalent(P, Q))
+        self.assertEqual(len(Q.get_terms()), 2)
+        self.assertTrue(B | E in Q.get_terms())
+        self.assertTrue(factor_local(A) is A)
+        R = Prop('&', A | B, C | D, ~E)
+        self.assertTrue(factor_local(R) is R)
+        for seed in range(20):
+            rnd = random.Random(seed)
+            terms = [Prop('|', *[Prop(rnd.choice("ABCDE")) if rnd.random() < 0.5 else ~Prop(rnd.choice("ABCDE"))
+                                 for _ in range(3)]) for _ in range(8)]
+            P = Prop('&', *terms)
+            self.assertTrue(is_equivalent(factor_at_top(P), P))
+
+    def test_espresso(self):
+        A, B, C, D = [Prop(x) for x in "ABCD"]
+        majority = (A & B & C) | (A & B & ~C) | (A & ~B & C) | (~A & B & C)
+        self.assertEqual(minimize_sop(majority), Prop('|', A & B, A & C, B & C))
+        self.assertEqual(minimize_pos((A | B) & (A | ~B) & (C | D)), A & (C | D))
+        self.assertEqual(minimize_sop((A & B) | (A & ~B)), A)
+        self.assertEqual(minimize_sop(A & ~A), Prop(False))
+        self.assertEqual(minimize_pos(A | ~A), Prop(True))
+        # no variables: the only cube is 0
+        T, F = Prop(True), Prop(False)
+        for P in [T, ~F, ~Prop('|', F), Prop('&', T)]:
+            self.assertEqual((minimize_sop(P), minimize_pos(P)), (T, T))
+        for P in [F, ~T, Prop('|', F, ~T)]:
+            self.assertEqual((minimize_sop(P), minimize_pos(P)), (F, F))
+        self.assertEqual(minimize_sop(~(A & (B | ~C))), ~A | (~B & C))
+
+        rnd = random.Random(4)
+        def random_prop(depth):
+            if depth == 0 or rnd.random() < 0.2:
+                x = Prop(rnd.choice("ABCDE"))
+                return ~x if rnd.random() < 0.5 else x
+            if rnd.random() < 0.2:
+                return ~random_prop(depth - 1)
+            return Prop(rnd.choice("&|"), *[random_prop(depth - 1) for _ in range(rnd.randint(2, 3))])
+        def two_level(P, op):
+            terms = [P] if P.is_atomic() or P.get_op() != op else P.get_terms()
+            return all(x.is_literal() or all(y.is_literal() for y in x.get_terms()) for x in terms)
+        for _ in range(100):
+            P = random_prop(5)
+            S, Q = minimize_sop(P), minimize_pos(P)
+            self.assertTrue(is_equivalent(S, P))
+            self.assertTrue(is_equivalent(Q, P))
+            self.assertTrue(two_level(S, '|') and two_level(Q, '&'))
+
+    def test_hypo_n(self):
+        A, B, C, D, E = [Prop(x) for x in "ABCDE"]
+        P = simplify_pure((A | B | ~C) & (~A | D | E) & (B | ~D | ~E) & \
+                          (C | ~B | E) & (~A | ~B | D) & (A | ~E | C))
+        table = brute_force_table(P, "ABCDE")
+        for vars_ in [[A], [A, B], [C, A, E], [A, B, C, D], [A, B, C, D, E]]:
+            self.assertEqual(brute_force_table(hypo_n(P, vars_), "ABCDE"), table)
+        self.assertEqual(hypo_n(P, [A, B]), hypo2(P, A, B))
+        self.assertEqual(hypo_n(A & ~B, [A, B]), A & ~B)
+        self.assertEqual(hypo_n(A & ~A, [A]), Prop(False))
+        for depth in [3, 4]:
+            res = ultra_simplify(P, depth)
+            if res is not None:
+                self.assertEqual(brute_force_table(res, "ABCDE"), table)
+                self.assertTrue(res.size() < P.size())
+
+    def test_truthtable(self):
+        A, B, C, D = [Prop(x) for x in "ABCD"]
+        T = Prop(True)
+        F = Prop(False)
+        self.assertTrue(is_tautology(((A > B) & (B > C)) > (A > C)))
+        self.assertTrue(is_tautology(T))
+        self.assertFalse(is_tautology(A | B))
+        self.assertTrue(is_contradiction(A & ~A & B))
+        self.assertTrue(is_equivalent(~(A & B), ~A | ~B))
+        self.assertFalse(is_equivalent(A > B, B > A))
+        self.assertEqual(count_models(A | B), 3)
+        self.assertEqual(count_models(A | B, variables(A, B, C)), 6)
+        self.assertEqual(count_models(F), 0)
+
+        names = "ABCDEFGH"
+        V = [Prop(x) for x in names]
+        P = (V[0] & ~V[6]) | (V[7] & (V[1] | ~V[3])) | ~(V[2] | V[4] & V[5])
+        vars_, table = truth_table(P)
+        self.assertEqual(vars_, V)
+        expected = brute_force_table(P, names)
+        self.assertEqual(count_models(P), sum(expected))
+
+        for expr in self.cases + [P]:
+            self.assertTrue(is_equivalent(simplify(expr, verify=True), expr))
+
+    def test_bdd(self):
+        A, B, C, D = [Prop(x) for x in "ABCD"]
+        self.assertTrue(bdd.is_tautology(((A > B) & (B > C)) > (A > C)))
+        self.assertTrue(bdd.is_equivalent(~(A & B), ~A | ~B))
+        self.assertFalse(bdd.is_equivalent(A > B, B > A))
+
+        manager = bdd.BDD()
+        P = (A & ~B) | (C & (B | ~D)) | (~A & D)
+        u = manager.from_prop(P)
+        self.assertEqual(manager.from_prop(simplify(P)), u)
+        self.assertTrue(is_equivalent(manager.to_prop(u), P))
+        for assignment in [{A: True}, {B: False, D: True}, {A: False, C: True}]:
+            Q = manager.to_prop(manager.restrict(u, assignment))
+            domain = set(v if b else ~v for v, b in assignment.items())
+            self.assertTrue(is_equivalent(Q, propagate_hypothesis(P, domain)))
+        self.assertEqual(manager.restrict(u, {A: True, B: False}), bdd.TRUE)
+
+        X = [Prop('X%d' % i) for i in range(4)]
+        Y = [Prop('Y%d' % i) for i in range(4)]
+        manager = bdd.BDD(X + Y)
+        roots = [manager.from_prop(Prop('|', *[x & y for x, y in zip(X, Y)]))]
+        self.assertEqual(manager.size(roots), 30)
+        before = manager.to_prop(roots[0])
+        sifted, sifted_roots = manager.sift(roots)
+        self.assertTrue(sifted is manager and sifted_roots == roots)
+        self.assertEqual(sifted.size(sifted_roots), 8)
+        self.assertTrue(is_equivalent(sifted.to_prop(sifted_roots[0]), before))
+        # the nodes stay canonical through the swaps
+        self.assertEqual(manager.from_prop(Prop('|', *[y & x for x, y in zip(X, Y)])), roots[0])
+        manager.swap(3)
+        other, other_roots = manager.reordered(list(manager.order), roots)
+        self.assertEqual(manager.size(roots), other.size(other_roots))
+        self.assertTrue(manager.size(roots) > 8)
+        self.assertTrue(is_equivalent(manager.to_prop(roots[0]), before))
+
+        for expr in self.cases + [P]:
+            res = bdd.simplify_bdd(expr)
+            self.assertTrue(is_equivalent(res, expr))
+            self.assertTrue(res.size() <= expr.size())
+
+    def test_evaluate(self):
+        A, B, C = [Prop(x) for x in "ABC"]
+        P = (A & ~B) | (C & (A | ~B)) | ~(A | C)
+        rows = [[bool(i >> k & 1) for k in range(3)] for i in range(8)]
+        expected = brute_force_table(P, "ABC")
+        check = P.compile()
+        self.assertEqual(check.variables, ['A', 'B', 'C'])
+        self.assertEqual([bool(x) for x in check(rows)], expected)
+        columns = dict((n, [row[k] for row in rows]) for k, n in enumerate("ABC"))
+        self.assertEqual([bool(x) for x in check(columns)], expected)
+        self.assertEqual([P.evaluate(dict(zip("ABC", row))) for row in rows], expected)
+        self.assertEqual([check.evaluate(row) for row in rows], expected)
+        # shared subterms are computed once
+        self.assertEqual(check.source.count('not '), 2)
+
+        check = P.compile(['C', 'B', 'A'])
+        self.assertEqual([bool(x) for x in check([row[::-1] for row in rows])], expected)
+        self.assertEqual([bool(x) for x in Prop(True).compile()([[], []])], [True, True])
+        self.assertFalse((A & Prop(False)).evaluate({'A': True}))
+
+    def test_components(self):
+        A, B, C, D, E, F = [Prop(x) for x in "ABCDEF"]
+        P = Prop('&', A | B, ~C, B | ~E, D | F, ~F | C, Prop(True))
+        groups = components(P)
+        self.assertEqual(sorted(len(g) for g in groups), [1, 2, 3])
+        self.assertEqual(set(Prop('&', *g) for g in groups),
+                         set([Prop('&', A | B, B | ~E), Prop('&', D | F, ~F | C, ~C),
+                              Prop('&', Prop(True))]))
+
+        Q = Prop('|', (A & B) | (A & ~C) | (~A & B & C), (D & ~E) | (D & F) | (~D & ~F & E))
+        res = simplify(Q)
+        self.assertTrue(is_equivalent(res, Q))
+        self.assertTrue(res.size() < Q.size())
+        self.assertTrue(simplify_pure(res) is res)
+        with HypothesisPool(2) as pool:
+            self.assertEqual(ultra_simplify(simplify_pure(Q), 2, pool),
+                             ultra_simplify(simplify_pure(Q), 2))
+
+    def test_dimacs(self):
+        text = ["c a comment", "p cnf 4 3", "1 -2 0", "2 3", "-4 0 -1", "0", "%", "0"]
+        P = parse_dimacs(text)
+        x = [None] + [Prop('x%d' % i) for i in range(1, 5)]
+        self.assertEqual(P, Prop('&', x[1] | ~x[2], Prop('|', x[2], x[3], ~x[4]), Prop('|', ~x[1])))
+        self.assertEqual(parse_dimacs(["p cnf 1 1", "1 0"], "-AB".__getitem__),
+                         Prop('&', Prop('|', Prop('A'))))
+        self.assertEqual(parse_dimacs(["p cnf 0 0"]), Prop(True))
+        self.assertEqual(parse_dimacs(["p cnf 1 1", "0"]), Prop('&', Prop(False)))
+
+        A, B, C = [Prop(x) for x in "ABC"]
+        Q = Prop('&', A | ~B, Prop('|', B, C, ~A), ~C)
+        out = StringIO()
+        write_dimacs(Q, out)
+        read = Prop('&', A | ~B, Prop('|', B, C, ~A), Prop('|', ~C))
+        self.assertEqual(parse_dimacs(out.getvalue().splitlines()), read)
+        self.assertTrue("p cnf 3 3" in out.getvalue())
+
+        path = tempfile.mktemp('.cnf')
+        try:
+            with open(path, 'w') as f:
+                write_dimacs(Q, f)
+            self.assertEqual(read_dimacs(path), read)
+            self.assertEqual(read_dimacs(u'' + path), read)
+            # file objects without a descriptor are read line by line
+            with open(path, 'rb') as f:
+                data = f.read()
+            self.assertEqual(read_dimacs(io.BytesIO(data)), read)
+            self.assertEqual(read_dimacs(StringIO(data.decode('ascii'))), read)
+            with open(path, 'w') as f:
+                pass
+            self.assertEqual(read_dimacs(path), Prop(True))
+        finally:
+            os.remove(path)
+
+        out = StringIO()
+        write_dimacs((A & ~B) | C, out, 'dnf')
+        self.assertTrue("p dnf 3 2" in out.getvalue())
+        self.assertEqual(parse_dimacs(out.getvalue().splitlines()), Prop('|', A & ~B, Prop('&', C)))
+        self.assertEqual(parse_dimacs(["p dnf 2 2", "1 -2 0", "0"]),
+                         Prop('|', Prop('x1') & ~Prop('x2'), Prop(True)))
+        self.assertEqual(parse_dimacs(["p dnf 0 0"]), Prop(False))
+        self.assertRaises(NameError, parse_dimacs, ["p sat 1", "1 0"])
+        out = StringIO()
+        write_dimacs(Prop(False), out)
+        self.assertEqual(out.getvalue(), "p cnf 0 1\n0\n")
+        self.assertRaises(NameError, write_dimacs, (A & ~B) | C, StringIO())
+
+    def test_deep(self):
+        # left-deep chains, far deeper than the recursion limit
+        A, B, C = [Prop(x) for x in "ABC"]
+        def chain(n):
+            P = A
+            for i in range(n):
+                P = (P & B) if i % 2 else (P | ~C)
+            return ~P
+        P, Q = chain(5000), chain(5000)
+        self.assertEqual(P.size(), 12502)
+        self.assertEqual(P.depth(), 5002)
+        self.assertEqual(P.var_stats()[C], [2500, 0])
+        self.assertTrue(P == Q and P != chain(4999))
+        self.assertEqual(len(repr(P)), len(repr(Q)))
+        self.assertEqual(str(chain(50)).count('\n'), 50)
+        self.assertEqual(associative_collect(P), P)
+        self.assertEqual(push_neg(P).size(), 12502)
+        self.assertEqual(simplify_everywhere(P), P)
+        self.assertEqual(simplify_pure(propagate_hypothesis(P, {C})), ~A | ~B)
+        self.assertEqual(factor_at_top(P), P)
+        R = simplify_pure(P)
+        self.assertTrue(R.size() < 10)
+        self.assertTrue(is_equivalent(P, R))
+        self.assertTrue(bdd.is_equivalent(P, R))
+        self.assertFalse(P.evaluate({'A': True, 'B': True, 'C': True}))
+
+    def test_dag(self):
+        A, B, C, D = [Prop(x) for x in "ABCD"]
+        P = ((A & ~B) | ~(C | (A & ~B))) & Prop('|', ~~D, Prop(True), A) & Prop('&', C)
+        dag, root = DAG.from_prop(P)
+        self.assertEqual(dag.to_prop(root), P)
+        self.assertEqual(dag.size(root), P.size())
+        self.assertEqual(dag.depth(root), P.depth())
+        self.assertEqual(dag.var_stats(root),
+                         dict((v.name, c) for v, c in P.var_stats().items()))
+        # A & ~B is stored once
+        self.assertEqual(dag.add_prop(A & ~B), dag.add_prop(~B & A))
+        subterms = set()
+        todo = [P]
+        while todo:
+            x = todo.pop()
+            subterms.add(x)
+            if not x.is_atomic():
+                todo += x.get_terms()
+        self.assertEqual(len(dag.reachable(root)), len(subterms))
+        names = ['A', 'B', 'C', 'D']
+        for row in itertools.product([False, True], repeat=4):
+            assignment = dict(zip(names, row))
+            self.assertEqual(dag.evaluate(root, assignment), P.evaluate(assignment))
+
+        small, new_root = dag.simplify_basic(root)
+        Q = small.to_prop(new_root)
+        self.assertTrue(is_equivalent(P, Q))
+        self.assertEqual(Q, simplify_basic(P))
+        # only the constants are left unreachable
+        self.assertEqual(set(small.reachable(new_root)) | set([0, 1]), set(range(len(small))))
+
+        cnf = ['p cnf 3 2', '1 -2 0', '2 3 -1 0']
+        dag = DAG()
+        root = parse_dimacs(cnf, dag=dag)
+        self.assertEqual(dag.to_prop(root), parse_dimacs(cnf))
+
+        dag.freeze()
+        self.assertRaises(NameError, dag.atom, 'E')
+        self.assertEqual(DAG().mk(2, [1, 0]), 0)
+
+        # complementary terms are found once the negations are pushed down
+        E, F = Prop('E'), Prop('F')
+        P = Prop('|', Prop('&', ~(B & A) | C | (F | ~E | (B & A))))
+        dag, root = DAG.from_prop(P)
+        small, root = dag.simplify_basic(root)
+        self.assertEqual(small.to_prop(root), Prop(True))
+        self.assertEqual(simplify_basic(P), Prop(True))
+
+        # equivalent to simplify_basic, and constant when it is
+        rand = random.Random(3)
+        atoms = [A, B, C, D, Prop(True), Prop(False)]
+        def random_prop(depth):
+            if depth == 0 or rand.random() < 0.25:
+                return rand.choice(atoms)
+            op = rand.choice('&|~')
+            if op == '~':
+                return ~random_prop(depth - 1)
+            return Prop(op, *[random_prop(depth - 1) for _ in range(rand.randint(1, 3))])
+        for i in range(300):
+            P = random_prop(5)
+            dag, root = DAG.from_prop(P)
+            small, root = dag.simplify_basic(root)
+            Q, R = small.to_prop(root), simplify_basic(P)
+            self.assertTrue(is_equivalent(Q, P))
+            if R in [Prop(True), Prop(False)]:
+                self.assertEqual(Q, R)
+
+        # the atoms 1 and 0 are not the constants
+        dag, root = DAG.from_prop(Prop('|', Prop(1) & A, Prop(0)))
+        self.assertEqual(len(dag.reachable(root)), 5)
+        self.assertFalse(dag.evaluate(root, {1: False, 0: False, 'A': True}))
+        self.assertTrue(dag.evaluate(root, {1: True, 0: False, 'A': True}))
+        self.assertTrue(all(x.name is not True and x.name is not False
+                            for x in dag.to_prop(root).var_stats()))
+
+    def test_instrument(self):
+        A, B, C, D = [Prop(x) for x in "ABCD"]
+        P = (A & B) | (A & C) | (~A & D) | (B & C & D)
+        clear_caches()
+        instrument.reset()
+        events = []
+        instrument.enable(events.append)
+        try:
+            res = simplify(P)
+        finally:
+            instrument.disable()
+            instrument.remove_callback(events.append)
+        report = instrument.report()
+        for name in ['simplify_pure', 'ultra_simplify', 'factor_at_top', 'propagate_hypothesis']:
+            self.assertTrue(report[name]['calls'] > 0)
+            self.assertEqual(report[name]['calls'], len([e for e in events if e['pass'] == name]))
+        self.assertTrue(report['simplify_pure']['visited'] > 0)
+        self.assertTrue(any(e['depth'] > 0 for e in events))
+        outer = [e for e in events if e['pass'] == 'simplify_pure' and e['depth'] == 0]
+        self.assertEqual(outer[0]['size_before'], simplify_basic(P).size())
+        self.assertEqual(outer[0]['size_after'], simplify_pure(P).size())
+
+        simplify_pure(P)
+        self.assertEqual(instrument.report(), report)
+        instrument.reset()
+        self.assertEqual(instrument.report(), {})
+
+    def test_parse(self):
+        A, B, C, D = [Prop(x) for x in "ABCD"]
+        for P in [A, ~A, ~~A, Prop(True), ~Prop(False), A & B, Prop('&', A, B, C),
+                  Prop('|', A, B, ~C), (A & ~B) | ~(C | D), Prop('&', A),
+                  Prop('|', A & B), ~Prop('|', A), (A & (B & C)) | D]:
+            self.assertEqual(parse(repr(P)), P)
+        self.assertEqual(parse('A > B'), A > B)
+        self.assertEqual(parse('A - B & C'), (A - B) & C)
+        self.assertEqual(parse('A | B > C & D'), (A | B) > (C & D))
+        self.assertEqual(parse('~A&B|C'), Prop('|', ~A & B, C))
+        for text in ['', 'A &', 'A B', '(A | B', 'A $ B', ')']:
+            self.assertRaises(NameError, parse, text)
+
+        parsed = list(parse_lines(['A & B', '', '# comment', ' ~A | C ']))
+        self.assertEqual(parsed, [A & B, ~A | C])
+        a = [x for x in parsed[0].get_terms() if x == A][0]
+        not_a = [x for x in parsed[1].get_terms() if x == ~A][0]
+        self.assertTrue(a is not_a.get_terms()[0])
+        self.assertTrue(Parser().atom('A') == A)
+
+    def test_shared(self):
+        A, B, C, D = [Prop(x) for x in "ABCD"]
+        S = (A & ~B) | C
+        out = StringIO()
+        write_shared((S & D) | (S & ~D), out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], '@1 = ' + repr(S))
+        self.assertEqual(read_shared(StringIO(out.getvalue())), (S & D) | (S & ~D))
+        for P in [A, ~A, Prop(True), Prop('&', A), ~~(A & B), ~Prop('|', A & B, C)]:
+            out = StringIO()
+            write_shared(P, out)
+            self.assertEqual(out.getvalue(), repr(P) + '\n')
+            self.assertEqual(read_shared(StringIO(out.getvalue())), P)
+
+        # exponentially many occurrences of the subterms, written once each
+        P = A
+        for i in range(40):
+            v = Prop('v%d' % i)
+            P = (P & v) | (P & ~v) | B
+        out = StringIO()
+        write_shared(P, out)
+        self.assertEqual(len(out.getvalue().splitlines()), 40)
+        Q = read_shared(StringIO(out.getvalue()))
+        self.assertEqual(persistent.canonical_key(Q), persistent.canonical_key(P))
+
+        # deep propositions are cut into lines
+        P = A
+        for i in range(3000):
+            P = Prop('&' if i % 2 else '|', P, Prop('v%d' % (i % 7)))
+        out = StringIO()
+        write_shared(P, out, max_depth=20)
+        self.assertTrue(len(out.getvalue().splitlines()) > 100)
+        self.assertEqual(read_shared(StringIO(out.getvalue())), P)
+
+        # names bound for a proposition are used for the next ones
+        out = StringIO()
+        writer = SharedWriter(out)
+        writer.write((S & D) | (S & ~D))
+        writer.write(S | ~D)
+        self.assertEqual(sorted(out.getvalue().splitlines()[-1].split(' | ')), ['@1', '~D'])
+        self.assertEqual(list(parse_shared(StringIO(out.getvalue()))),
+                         [(S & D) | (S & ~D), S | ~D])
+        # lines of propositions starting with a name are not bindings
+        writer.write(S)
+        self.assertEqual(out.getvalue().splitlines()[-1], '@1')
+        self.assertEqual(list(parse_shared(StringIO(out.getvalue())))[-1], S)
+        E = Prop('E')
+        text = '@1 = ' + repr(S) + '\n@1 & ~E & (~A | @1 | ~D)\n'
+        self.assertEqual(read_shared(StringIO(text)), Prop('&', S, ~E, Prop('|', ~A, S, ~D)))
+        self.assertRaises(NameError, write_shared, Prop('a b') & A, StringIO())
+        self.assertRaises(NameError, read_shared, StringIO('@1 | A\n'))
+        self.assertRaises(NameError, read_shared, StringIO(''))
+
+    def test_to_bytes(self):
+        A, B, C = [Prop(x) for x in "ABC"]
+        for P in [A, ~A, Prop(True), Prop(False), Prop(1), Prop('&', A), A & ~B,
+                  (A | (B & ~C)) & ~(A & B)]:
+            data = to_bytes(P)
+            for Q in [from_bytes(data), from_bytes(bytearray(data)), from_bytes(memoryview(data)),
+                      pickle.loads(pickle.dumps(P, 2))]:
+                self.assertEqual(Q, P)
+        # shared subterms are read back as the same object
+        S = A | (B & ~C)
+        Q = from_bytes(to_bytes(S & ~S))
+        self.assertEqual(Q, S & ~S)
+        negated = [x for x in Q.get_terms() if x.get_op() == '~'][0]
+        self.assertTrue(negated.get_terms()[0] is
+                        [x for x in Q.get_terms() if x is not negated][0])
+        self.assertTrue(from_bytes(to_bytes(Prop(1))).name is not True)
+        self.assertTrue(from_bytes(to_bytes(Prop(True))).name is True)
+        self.assertRaises(NameError, from_bytes, b'not a proposition')
+        self.assertRaises(NameError, from_bytes, to_bytes(A & B)[:-1])
+        # corrupt opcodes and child indices
+        data = bytearray(to_bytes(A & ~B))
+        for i in range(4, len(data)):
+            for byte in [0x7f, 0xff]:
+                corrupt = data[:]
+                corrupt[i] = byte
+                try:
+                    from_bytes(corrupt)
+                except NameError:
+                    pass
+
+        # several propositions share their subterms
+        S = (A | (B & ~C)) & ~(A & B)
+        props = [S, S | C, ~S]
+        data = to_bytes(*props)
+        self.assertTrue(len(data) < len(to_bytes(S)) + 40)
+        R = from_bytes_all(data)
+        self.assertEqual(R, props)
+        self.assertTrue(R[0] in R[1].terms)
+        self.assertTrue(all(x is R[0] for x in R[1].terms | R[2].terms if x == S))
+        self.assertEqual(from_bytes_all(to_bytes()), [])
+        self.assertRaises(NameError, from_bytes, data)
+
+        # shared subterms are stored once, deep propositions are fine
+        P = A
+        for i in range(40):
+            v = Prop('v%d' % i)
+            P = (P & v) | (P & ~v)
+        self.assertTrue(len(to_bytes(P)) < 5000)
+        self.assertEqual(persistent.canonical_key(from_bytes(to_bytes(P))), persistent.canonical_key(P))
+        P = A
+        for i in range(20000):
+            P = Prop('&' if i % 2 else '|', P, Prop('v%d' % (i % 7)))
+        self.assertEqual(pickle.loads(pickle.dumps(P, 2)), P)
+
+        I = intern_tree((A & B) | ~C)
+        self.assertTrue(pickle.loads(pickle.dumps(I, 2)) is I)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,188 @@
+"""Exact semantics of small propositions through truth tables.
+
+A proposition over n variables is compiled into its truth table, a
+bitset of 2^n bits where bit b is the value of the proposition under the
+assignment giving to the i-th variable the i-th bit of b. Each operator
+then costs a handful of bitwise operations on the whole table: on packed
+uint64 NumPy arrays, or on Python integers when NumPy is not available.
+This is exact and fast up to about MAX_VARS variables."""
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+MAX_VARS = 25
+
+def variables(*props):
+    """The atoms (other than True and False) of props, in a stable order."""
+    seen = set()
+    for P in props:
+        for v in P.var_stats():
+            if v.name not in [True, False]:
+                seen.add(v)
+    return sorted(seen, key=lambda v: str(v.name))
+
+class _IntTables(object):
+    """Truth tables of 2^n bits as Python integers."""
+
+    def __init__(self, n):
+        self.n = n
+        self.bits = 1 << n
+        self.full = (1 << self.bits) - 1
+
+    def const(self, value):
+        return self.full if value else 0
+
+    def var(self, i):
+        period = 1 << i
+        pattern = ((1 << period) - 1) << period
+        width = 2*period
+        while width < self.bits:
+            pattern |= pattern << width
+            width *= 2
+        return pattern
+
+    def neg(self, t):
+        return self.full ^ t
+
+    def is_full(self, t):
+        return t == self.full
+
+    def is_empty(self, t):
+        return t == 0
+
+    def count(self, t):
+        return bin(t).count('1')
+
+# 64-bit words of the tables of the first 6 variables
+_WORD_PATTERNS = [0xAAAAAAAAAAAAAAAA, 0xCCCCCCCCCCCCCCCC, 0xF0F0F0F0F0F0F0F0,
+                  0xFF00FF00FF00FF00, 0xFFFF0000FFFF0000, 0xFFFFFFFF00000000]
+
+class _NumpyTables(object):
+    """Truth tables of 2^n bits as packed uint64 NumPy arrays."""
+
+    def __init__(self, n):
+        self.n = n
+        self.words = max(1, (1 << n) // 64)
+        mask = (1 << (1 << n)) - 1 if n < 6 else 0xFFFFFFFFFFFFFFFF
+        self.full = numpy.empty(self.words, dtype=numpy.uint64)
+        self.full.fill(mask)
+
+    def const(self, value):
+        if value:
+            return self.full
+        return numpy.zeros(self.words, dtype=numpy.uint64)
+
+    def var(self, i):
+        if i < 6:
+            t = numpy.empty(self.words, dtype=numpy.uint64)
+            t.fill(_WORD_PATTERNS[i])
+            return t & self.full
+        index = numpy.arange(self.words, dtype=numpy.uint64)
+        bit = (index >> numpy.uint64(i - 6)) & numpy.uint64(1)
+        return bit * numpy.uint64(0xFFFFFFFFFFFFFFFF)
+
+    def neg(self, t):
+        return self.full ^ t
+
+    def is_full(self, t):
+        return bool(numpy.array_equal(t, self.full))
+
+    def is_empty(self, t):
+        return not t.any()
+
+    def count(self, t):
+        return int(numpy.unpackbits(t.view(numpy.uint8)).sum())
+
+def _tables(vars_):
+    if len(vars_) > MAX_VARS:
+        raise NameError("Too many variables for a truth table: "+str(len(vars_)))
+    if numpy is not None:
+        return _NumpyTables(len(vars_))
+    return _IntTables(len(vars_))
+
+def _compile(P, vars_, tables):
+    """Truth table of P, each distinct subterm being computed once. The
+    table of a subterm is dropped as soon as the last of its parents is
+    computed, so that only the tables still needed are held (a table
+    takes 4 MB at MAX_VARS variables)."""
+    index = dict((v, i) for i, v in enumerate(vars_))
+
+    # the distinct subterms, each after its terms
+    number = {}
+    order = []
+    stack = [(P, False)]
+    while stack:
+        Q, expanded = stack.pop()
+        if Q in number:
+            continue
+        if expanded or Q.is_atomic():
+            number[Q] = len(order)
+            order.append(Q)
+            continue
+        stack.append((Q, True))
+        stack.extend([(x, False) for x in Q.get_terms() if x not in number])
+
+    # number of parents of every subterm whose table is not computed yet
+    parents = [0]*len(order)
+    kids = [None]*len(order)
+    for i, Q in enumerate(order):
+        if not Q.is_atomic():
+            kids[i] = [number[x] for x in Q.get_terms()]
+            for k in kids[i]:
+                parents[k] += 1
+
+    results = [None]*len(order)
+    for i, Q in enumerate(order):
+        if Q.is_atomic():
+            if Q.name in [True, False]:
+                t = tables.const(Q.name)
+            else:
+                t = tables.var(index[Q])
+        else:
+            subs = [results[k] for k in kids[i]]
+            if Q.get_op() == '~':
+                t = tables.neg(subs[0])
+            else:
+                t = subs[0]
+                for x in subs[1:]:
+                    t = t & x if Q.get_op() == '&' else t | x
+            for k in kids[i]:
+                parents[k] -= 1
+                if parents[k] == 0:
+                    results[k] = None
+        results[i] = t
+    return results[-1]
+
+def truth_table(P, vars_=None):
+    """Returns (vars_, table): the truth table of P over vars_, by default
+    the variables of P. See the module documentation for the layout."""
+    if vars_ is None:
+        vars_ = variables(P)
+    tables = _tables(vars_)
+    return vars_, _compile(P, vars_, tables)
+
+def is_tautology(P):
+    vars_ = variables(P)
+    tables = _tables(vars_)
+    return tables.is_full(_compile(P, vars_, tables))
+
+def is_contradiction(P):
+    vars_ = variables(P)
+    tables = _tables(vars_)
+    return tables.is_empty(_compile(P, vars_, tables))
+
+def is_equivalent(P, Q):
+    """True iff P and Q have the same value under every assignment."""
+    vars_ = variables(P, Q)
+    tables = _tables(vars_)
+    return tables.is_empty(_compile(P, vars_, tables) ^ _compile(Q, vars_, tables))
+
+def count_models(P, vars_=None):
+    """Number of assignments of vars_ (by default, the variables of P)
+    satisfying P. vars_ must contain the variables of P."""
+    if vars_ is None:
+        vars_ = variables(P)
+    tables = _tables(vars_)
+    return tables.count(_compile(P, vars_, tables))